@@ -1,2 +1,2 @@
 name = "rsa_archer"
-__all__ = ["archer_instance", "record", "user"]
+__all__ = ["archer_instance", "record", "user", "values_list_cache", "metadata_cache", "state_file", "async_archer_instance", "rate_limiter", "record_writer", "metrics", "attachment", "key_mapping", "export"]
@@ -1,28 +1,129 @@
 import logging
 import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from itertools import islice
+from urllib.parse import quote
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError
 
+from .export import RecordRowDecoder, open_export_writer
+from .key_mapping import DictKeyIndex, format_odata_literal, load_mapping_state, save_mapping_state
+from .attachment import ATTACHMENT_CHUNK_SIZE, AttachmentUploadStream, write_attachment_content
 from .user import User
-from .record import Record
+from .record import Record, RecordSchema
+from .metrics import RequestMetrics, get_body_size
+from .rate_limiter import RateLimiter, RequestGovernor
+from .record_writer import RecordWriter
+from .values_list_cache import ValuesList, ValuesListCache, has_value_names
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 log = logging.getLogger(__name__)
 
+GRC_PAGE_SIZE = 1000  # GRC content api returns up to 1000 records per call
+RETRY_STATUSES = (429, 500, 502, 503, 504)  # idempotent calls are repeated after these responses
+SUBFORM_METADATA_KEYS = ("LevelId", "ValuesListIds", "AllFields")  # entries of subforms_json_by_sf_name which aren't fields
+
+
+def get_schema_fields(fields_json, field_ids, values_list_ids):
+	"""
+	:param fields_json: application_fields_json or subforms_json_by_sf_name[subform name]
+	:param field_ids: all_application_fields_array or "AllFields" of the subform
+	:param values_list_ids: {field name: values list id}
+	:return: [(field id, field type, field name, values list id), ...] for RecordSchema, names are taken from fields_json
+			 except its "LevelId", "ValuesListIds" and "AllFields" entries
+	"""
+	names_by_id = {field_id: name for name, field_id in fields_json.items()
+				   if isinstance(name, str) and name not in SUBFORM_METADATA_KEYS}
+	return [(field_id, fields_json[field_id]["Type"], names_by_id.get(field_id),
+			 values_list_ids.get(names_by_id.get(field_id))) for field_id in field_ids]
+
+
+def get_retry_delay(response, attempt, backoff_factor):
+	"""
+	:param response: requests.Response or None after connection error
+	:param attempt: number of the retry, starting from 0
+	:param backoff_factor: see ArcherInstance
+	:return: seconds to wait, from Retry-After header if server sent it, otherwise exponential backoff
+	"""
+	retry_after = response.headers.get("Retry-After") if response is not None else None
+	if retry_after:
+		try:
+			return max(0.0, float(retry_after))
+		except ValueError:
+			try:
+				return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+			except (TypeError, ValueError):
+				pass
+
+	return backoff_factor * (2 ** attempt)
+
+
+def quote_odata_option(value):
+	"""
+	:param value: value of $filter, $select or $orderby
+	:return: value percent-encoded for the query string, so "#", "&" and "+" in literals reach the server as they are
+	"""
+	return quote(value, safe=",'()$:")
+
+
+def is_connect_error(error):
+	"""
+	:param error: exception raised by requests
+	:return: True if connection was not established, so the call was not sent and it's safe to repeat any call
+	"""
+	if isinstance(error, requests.exceptions.ConnectTimeout):
+		return True
+	reason = error.args[0] if error.args else None
+	return isinstance(reason, MaxRetryError) and isinstance(reason.reason, NewConnectionError)
+
+def get_header_token(headers):
+	"""
+	:param headers: headers of a call, {"Authorization": "Archer session-id=token", ...}
+	:return: session token which is sent with these headers, None if there is no Archer authorization header
+	"""
+	authorization = headers.get("Authorization") or ""
+	prefix = "Archer session-id="
+	return authorization[len(prefix):] if authorization.startswith(prefix) else None
+
+
 # PART BELOW IS USING ARCHER REST API
 
 class ArcherInstance:
 	"""
 	Creates archer instance object using following arguments:
-		:param inst_url - archer instance base url, without https://
+		:param inst_url - archer instance base url, without https://, could include port, e.g. "localhost:8080"
 		:param instance_name - archer instance name
 		:param username - of api user
 		:param password - of api user
+		:param pool_connections - number of connection pools to cache (one per host)
+		:param pool_maxsize - max number of keep-alive connections kept per host, set it to the number of threads you use
+		:param max_retries - number of retries on connection errors, idempotent calls are also retried on 429/5xx responses
+		:param backoff_factor - sleep between retries is backoff_factor * (2 ** (retry number - 1))
+		:param keep_alive - if False every request asks server to close the connection
+		:param values_list_cache_size - max number of values lists kept in memory
+		:param values_list_cache_ttl - seconds after which values list is downloaded again, None keeps it forever
+		:param metadata_cache - MetadataCache object, keeps application metadata on disk between runs of from_application()
+		:param governor - RequestGovernor object, limits rate and number of calls in flight (per endpoint class as well)
+		:param metrics - RequestMetrics object, collects count, bytes and latency of calls per operation
+		:param scheme - "http" for a local test server, e.g. rsa_archer.tests.mock_archer
+		:param key_index - key field value to record id index, DictKeyIndex (in memory) by default,
+						   SQLiteKeyIndex keeps it on disk and shares it between processes
 	"""
 
-	def __init__(self, inst_url, instance_name, username, password):
+	def __init__(self, inst_url, instance_name, username, password, pool_connections=10, pool_maxsize=10,
+				 max_retries=3, backoff_factor=0.3, keep_alive=True, values_list_cache_size=256,
+				 values_list_cache_ttl=3600, metadata_cache=None, governor=None, metrics=None, scheme="https",
+				 key_index=None):
 
-		self.api_url_base = f"https://{inst_url}/RSAarcher/api/"
-		self.content_api_url_base = f"https://{inst_url}/RSAarcher/contentapi/"
+		self.api_url_base = f"{scheme}://{inst_url}/RSAarcher/api/"
+		self.content_api_url_base = f"{scheme}://{inst_url}/RSAarcher/contentapi/"
 		self.username = username
 		self.password = password
 		self.instance_name = instance_name
@@ -36,24 +137,216 @@ class ArcherInstance:
 		self.all_application_fields_array = []
 		self.vl_name_to_vl_id = {}
 		self.subforms_json_by_sf_name = {}
-		self.key_field_value_to_system_id = {}
+		self.record_schemas = {}  # {level id: RecordSchema}, see get_record_schema()
+		self.key_field_value_to_system_id = DictKeyIndex() if key_index is None else key_index
+		self.values_list_cache = ValuesListCache(values_list_cache_size, values_list_cache_ttl)
+		self.metadata_cache = metadata_cache
 
 		self.archer_groups_name_to_id = {}
+		self.users_by_id = {}
+
+		self.max_retries = max_retries
+		self.backoff_factor = backoff_factor
+		self.login_lock = threading.Lock()
+		self.governor = governor or RequestGovernor()
+		self.metrics = metrics or RequestMetrics()
+		self.session = self.build_session(pool_connections, pool_maxsize, keep_alive)
 
 		self.get_session_token()
 
+	def build_session(self, pool_connections=10, pool_maxsize=10, keep_alive=True):
+		"""
+		Pooled session shared by ArcherInstance, Record and User, so TCP+TLS handshake is done once per connection
+		:return: requests.Session object
+		"""
+		# the adapter doesn't retry, all retries are done in request(), so they are not multiplied
+		adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+
+		session = requests.Session()
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		session.verify = False
+		if not keep_alive:
+			session.headers["Connection"] = "close"
+
+		return session
+
+	def get_connection_stats(self):
+		"""
+		:return: {"requests": sent over the pool, "connections": opened, "reused": requests made over existing connection}
+		"""
+		stats = {"requests": 0, "connections": 0}
+
+		for adapter in set(self.session.adapters.values()):
+			pools = adapter.poolmanager.pools
+			for key in pools.keys():
+				pool = pools[key]
+				stats["requests"] += pool.num_requests
+				stats["connections"] += pool.num_connections
+
+		stats["reused"] = stats["requests"] - stats["connections"]
+		return stats
+
+	def close(self):
+		"""
+		Closes all pooled connections
+		"""
+		self.session.close()
+
+	def request(self, method, api_url, headers=None, idempotent=None, refresh_token=True, **kwargs):
+		"""
+		All calls to Archer go through this method:
+			if session token is expired (401) it's refreshed once and the call is repeated,
+			idempotent calls are retried with exponential backoff on 429/5xx and connection resets, Retry-After is respected,
+			any call is retried if connection was not established, it was not sent then
+		:param method: GET, POST, PUT or DELETE
+		:param api_url: full url
+		:param headers: self.header by default
+		:param idempotent: safe to repeat, by default True for GET, PUT, DELETE and for POST with X-Http-Method-Override GET
+		:param refresh_token: False for the login call itself
+		:param kwargs: passed to requests, e.g. data or json
+		:return: requests.Response
+		"""
+		headers = dict(self.header if headers is None else headers)
+		if idempotent is None:
+			idempotent = method in ("GET", "PUT", "DELETE") or headers.get("X-Http-Method-Override") == "GET"
+
+		endpoint_class = self.get_endpoint_class(api_url)
+		operation = self.get_operation_name(method, api_url, headers)
+		started = time.monotonic()
+		token_refreshed = False
+		attempt = 0
+		attempts = 0
+		response = None
+		error = None
+
+		try:
+			while True:
+				used_token = get_header_token(headers)
+				attempts += 1
+				try:
+					with self.governor.limit(endpoint_class):
+						response = self.session.request(method, api_url, headers=headers, verify=False, **kwargs)
+
+				except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+					if not (idempotent or is_connect_error(e)) or attempt >= self.max_retries:
+						raise
+					delay = get_retry_delay(None, attempt, self.backoff_factor)
+					attempt += 1
+					log.warning("Call to %s failed, retry %s in %.1f seconds, %s", api_url, attempt, delay, e)
+					time.sleep(delay)
+					continue
+
+				if response.status_code == 401 and refresh_token and not token_refreshed:
+					token_refreshed = True
+					response.close()  # the connection of a streamed response is released only when it's closed
+					self.refresh_session_token(used_token)
+					headers["Authorization"] = self.header["Authorization"]
+					continue
+
+				if response.status_code in RETRY_STATUSES and idempotent and attempt < self.max_retries:
+					delay = get_retry_delay(response, attempt, self.backoff_factor)
+					attempt += 1
+					log.warning("Call to %s returned %s, retry %s in %.1f seconds", api_url, response.status_code,
+								attempt, delay)
+					response.close()
+					time.sleep(delay)
+					continue
+
+				return response
+
+		except Exception as e:
+			error = f"{e.__class__.__name__}: {e}"
+			response = None
+			raise
+
+		finally:
+			if response is not None:
+				bytes_sent = get_body_size(response.request.body)
+				if kwargs.get("stream"):  # body is not read yet, size is taken from the header
+					bytes_received = int(response.headers.get("Content-Length") or 0)
+				else:
+					bytes_received = len(response.content)
+			else:
+				bytes_sent = get_body_size(kwargs.get("data"))
+				bytes_received = 0
+			self.metrics.record(operation, method, api_url, response.status_code if response is not None else None,
+								time.monotonic() - started, bytes_sent, bytes_received, attempts, error)
+
+	def get_endpoint_class(self, api_url):
+		"""
+		:param api_url: full url
+		:return: endpoint class used by governor, see RequestGovernor
+		"""
+		if api_url.startswith(self.content_api_url_base):
+			return "content_api"
+		if "core/content/fieldcontent" in api_url:
+			return "fieldcontent_read"
+		if "core/content" in api_url:
+			return "content_write"
+		if "core/system/user" in api_url:
+			return "user"
+		return "other"
+
+	def get_operation_name(self, method, api_url, headers):
+		"""
+		:param method: http method
+		:param api_url: full url
+		:param headers: headers of the call, X-Http-Method-Override of a POST call tells what the call does
+		:return: logical operation name used by metrics, e.g. "get_record" or "grc_page"
+		"""
+		if api_url.startswith(self.content_api_url_base):
+			return "grc_count" if "/$count" in api_url else "grc_page"
+
+		path = api_url[len(self.api_url_base):]
+		# calls of other methods are sent with self.header too, so their X-Http-Method-Override GET is ignored
+		action = headers.get("X-Http-Method-Override") or method if method == "POST" else method
+
+		if path.startswith("core/security/login"):
+			return "login"
+		if path.startswith("core/content/fieldcontent"):
+			return "get_record"
+		if path.startswith("core/content/attachment"):
+			return "post_attachment" if action == "POST" else "get_attachment"
+		if path.startswith("core/content"):
+			return {"POST": "create_content_record", "PUT": "update_content_record",
+					"DELETE": "delete_record"}.get(action, "get_content")
+		if path.startswith("core/system/valueslistvalue"):
+			return "get_values_list"
+		if path.startswith("core/system/usercontact"):
+			return "get_user_contact"
+		if path.startswith(("core/system/userrole", "core/system/usergroup")):
+			return "update_user"
+		if path.startswith("core/system/user"):
+			return "get_user" if action == "GET" else "update_user"
+		if path.startswith("core/system/group"):
+			return "get_groups"
+		if path.startswith(("core/system/application", "core/system/fielddefinition")):
+			return "get_application_metadata"
+		return "other"
+
+	def refresh_session_token(self, expired_token):
+		"""
+		Gets new session token once for all threads which got 401 with the same expired token
+		:param expired_token: token which was used in the failed call
+		"""
+		with self.login_lock:
+			if self.session_token == expired_token:  # otherwise another thread has already refreshed it
+				log.info("Archer session token is expired, logging in again")
+				self.get_session_token()
+
 	def get_session_token(self):
 		"""
-		Refresh Session Token, should be invoked periodically
+		Refresh Session Token, it's also refreshed automatically when Archer returns 401
 		"""
 
 		api_url = f"{self.api_url_base}core/security/login"
 		header = {"Accept": "application/json,text/html,application/xhtml+xml,application/xml;q =0.9,*/*;q=0.8",
 				  "Content-type": "application/json"}
 		try:
-			response = requests.post(api_url, headers=header, json={"InstanceName": self.instance_name,
-																	"Username": self.username, "UserDomain": "",
-																	"Password": self.password}, verify=False)
+			response = self.request("POST", api_url, headers=header, idempotent=True, refresh_token=False,
+									json={"InstanceName": self.instance_name, "Username": self.username,
+										  "UserDomain": "", "Password": self.password})
 
 			data = json.loads(response.content.decode("utf-8"))
 
@@ -77,12 +370,14 @@ class ArcherInstance:
 		api_url = f"{self.api_url_base}core/system/user/" + params
 
 		try:
-			response = requests.post(api_url, headers=self.header, verify=False)
+			response = self.request("POST", api_url, headers=self.header)
 
 			data = json.loads(response.content.decode("utf-8"))
 			list_of_users = []
 			for user in data:
-				list_of_users.append(User(self, user))
+				user = User(self, user)
+				self.users_by_id[str(user.get_user_id())] = user
+				list_of_users.append(user)
 
 			return list_of_users
 
@@ -96,7 +391,7 @@ class ArcherInstance:
 		api_url = f"{self.api_url_base}core/system/group/"
 
 		try:
-			response = requests.post(api_url, headers=self.header, verify=False)
+			response = self.request("POST", api_url, headers=self.header)
 			data = json.loads(response.content)
 			for group in data:
 				name = group["RequestedObject"]["Name"]
@@ -157,14 +452,44 @@ class ArcherInstance:
 		api_url = f"{self.api_url_base}core/system/user/" + str(user_id)
 
 		try:
-			response = requests.post(api_url, headers=self.header, verify=False)
+			response = self.request("POST", api_url, headers=self.header)
 			data = json.loads(response.content.decode("utf-8"))
 
-			return User(self, data)
+			user = User(self, data)
+			self.users_by_id[str(user_id)] = user
+			return user
 
 		except Exception as e:
 			log.error("Function get_user_by_id didn't work, %s", e)
 
+	def get_user(self, user_id):
+		"""
+		:param user_id: internal Archer user id
+		:return: User object from self.users_by_id, new users are created without any calls to Archer,
+				 details and email are loaded on the first access
+		"""
+		user_id = str(user_id)
+		user = self.users_by_id.get(user_id)
+		if user is None:
+			user = self.users_by_id.setdefault(user_id, User(self, user_id=user_id))
+		return user
+
+	def load_users(self, user_ids, workers=8, load_details=True, load_email=True):
+		"""
+		:param user_ids: iterable of internal Archer user ids
+		:param workers: number of users loaded at the same time
+		:param load_details: load user details (DisplayName, UserName, ...)
+		:param load_email: load user email from contacts
+		:return: list of User objects with loaded details and emails, users that are already loaded cost nothing
+		"""
+		users = [self.get_user(user_id) for user_id in user_ids]
+		unique_users = {id(user): user for user in users}.values()
+
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			list(executor.map(lambda user: user.load(load_details, load_email), unique_users))
+
+		return users
+
 	def get_active_users_with_no_login(self):
 		"""
 		:return: list of User objects
@@ -172,15 +497,25 @@ class ArcherInstance:
 		return self.get_users("?$select=Id,UserName,DisplayName&$filter=AccountStatus eq '1' "
 							  "and LastLoginDate eq null&$orderby=LastName")
 
-	def from_application(self, app_name=None):
+	def from_application(self, app_name=None, workers=8, preload_values_lists=False):
 		"""
 		:param app_name: sets app you will be working on; type name how it appears in Archer
-		:return: self, fills Archer_instance object with proper app_id and fields_ids
+		:param workers: number of subform definitions downloaded at the same time
+		:param preload_values_lists: download all values lists of the application as well, see get_application_fields()
+		:return: self, fills Archer_instance object with proper app_id and fields_ids,
+				 if metadata_cache is set fields are taken from disk without any calls to Archer
 		"""
+		if self.metadata_cache:
+			metadata = self.metadata_cache.load(self.get_metadata_cache_key(app_name))
+			if metadata:
+				self.set_application_metadata(metadata)
+				log.info("Application %s metadata is loaded from cache", app_name)
+				return self
+
 		api_url = f"{self.api_url_base}core/system/application/"
 
 		try:
-			response = requests.get(api_url, headers=self.header, verify=False)
+			response = self.request("GET", api_url, headers=self.header)
 			data = json.loads(response.content.decode("utf-8"))
 
 			all_folders = []
@@ -189,58 +524,127 @@ class ArcherInstance:
 			for application in data:
 				if application["RequestedObject"]["Name"] == app_name:
 					application_id = application["RequestedObject"]["Id"]
-					self.get_application_fields(application_id)
+					if not self.get_application_fields(application_id, workers, preload_values_lists):
+						raise RuntimeError(f'Metadata of application "{app_name}" is not loaded completely')
 					break
 				all_folders.append(application["RequestedObject"]["Name"])
 
 			if not application_id:
 				raise RuntimeError(f'Application "{app_name}" is not found, available applications are {all_folders}')
 
+			if self.metadata_cache:
+				self.metadata_cache.save(self.get_metadata_cache_key(app_name), self.get_application_metadata())
+
 		except Exception as e:
 			log.error("Function from_application() didn't work, %s", e)
 
 		return self
 
-	def get_application_fields(self, application_id):
+	def get_metadata_cache_key(self, app_name):
+		"""
+		:param app_name: application name how it appears in Archer
+		:return: key of the application in metadata_cache
+		"""
+		return f"{self.api_url_base}|{self.instance_name}|{app_name}"
+
+	def get_application_metadata(self):
+		"""
+		:return: dict with everything from_application() fills, used for metadata_cache
+		"""
+		return {"application_level_id": self.application_level_id,
+				"application_fields_json": self.application_fields_json,
+				"all_application_fields_array": self.all_application_fields_array,
+				"vl_name_to_vl_id": self.vl_name_to_vl_id,
+				"subforms_json_by_sf_name": self.subforms_json_by_sf_name}
+
+	def set_application_metadata(self, metadata):
+		"""
+		:param metadata: dict from get_application_metadata()
+		"""
+		self.application_level_id = metadata["application_level_id"]
+		self.application_fields_json = metadata["application_fields_json"]
+		self.all_application_fields_array = metadata["all_application_fields_array"]
+		self.vl_name_to_vl_id = metadata["vl_name_to_vl_id"]
+		self.subforms_json_by_sf_name = metadata["subforms_json_by_sf_name"]
+		self.record_schemas = {}
+
+	def invalidate_application_metadata(self, app_name=None):
+		"""
+		:param app_name: drop cached metadata of the application, or of all applications if not provided
+		"""
+		if self.metadata_cache:
+			self.metadata_cache.invalidate(self.get_metadata_cache_key(app_name) if app_name else None)
+
+	def get_application_fields(self, application_id, workers=8, preload_values_lists=False):
 		"""
 		:param application_id: Internal Archer application id, I found it in LevelId if I remember correctly
+		:param workers: number of subform (and values list) definitions downloaded at the same time
+		:param preload_values_lists: download all values lists of the application into values_list_cache as well
 		:return: Fills the object with all active application fields:
 				all_application_fields_array - array of active fields [id1, id2, id3]
 				application_fields_json - {{name:id}, {id: {"Type": f_type, "FieldId": id}}}
 				subforms_json_by_sf_name - {subform_name: {name:id}, {id: {"Type": f_type, "FieldId": id}},{"LevelId": level_id})
+				 True if the application and all its subforms are loaded, False otherwise
 		"""
 
 		api_url = f"{self.api_url_base}core/system/fielddefinition/application/" + str(
 				application_id) + "?$filter=IsActive eq true"
 
 		try:
-			response = requests.get(api_url, headers=self.header, verify=False)
+			response = self.request("GET", api_url, headers=self.header)
 			data = json.loads(response.content.decode("utf-8"))
-
-			for field in data:
-				name = field["RequestedObject"]["Name"]
-				id = field["RequestedObject"]["Id"]
-				level_id = field["RequestedObject"]["LevelId"]
-				f_type = field["RequestedObject"]["Type"]
-
-				self.all_application_fields_array.append(id)
-				self.application_fields_json.update({name: id})
-				self.application_fields_json.update({id: {"Type": f_type, "FieldId": id}})
-
-				if f_type == 4: #populate values for values list
-					self.vl_name_to_vl_id.update({name: field["RequestedObject"]["RelatedValuesListId"]})
-
-				elif f_type == 24: #populate fileds from subforms, up to text fields
-					subform_name = field["RequestedObject"]["Name"]
-					subform_id = field["RequestedObject"]["RelatedSubformId"]
-					subform_fields_json, all_fields = self.get_subform_fields_by_id(subform_id)
+			subform_ids_by_name = self.parse_application_fields(data)
+
+			# subforms are downloaded concurrently and merged in the order of application fields
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				if preload_values_lists:
+					values_lists = executor.map(self.get_values_list, list(self.vl_name_to_vl_id.values()))
+
+				subforms = executor.map(self.get_subform_fields_by_id, subform_ids_by_name.values())
+				for subform_name, subform in zip(subform_ids_by_name, subforms):
+					if subform is None:
+						raise RuntimeError(f'Subform "{subform_name}" is not loaded')
+					subform_fields_json, all_fields = subform
 					self.subforms_json_by_sf_name.update({subform_name: subform_fields_json})
 					self.subforms_json_by_sf_name[subform_name].update({"AllFields": all_fields})
 
-			self.application_level_id = str(level_id) # set the application ID, I found it here
+				if preload_values_lists:
+					list(values_lists)
+
+			return True
 
 		except Exception as e:
 			log.error("Function get_application_fields() didn't work, %s", e)
+			return False
+
+	def parse_application_fields(self, data):
+		"""
+		:param data: response of core/system/fielddefinition/application/{application_id}
+		:return: {subform_name: subform_id}, fills all_application_fields_array, application_fields_json,
+				 vl_name_to_vl_id and application_level_id
+		"""
+		subform_ids_by_name = {}
+		self.record_schemas = {}
+
+		for field in data:
+			name = field["RequestedObject"]["Name"]
+			id = field["RequestedObject"]["Id"]
+			level_id = field["RequestedObject"]["LevelId"]
+			f_type = field["RequestedObject"]["Type"]
+
+			self.all_application_fields_array.append(id)
+			self.application_fields_json.update({name: id})
+			self.application_fields_json.update({id: {"Type": f_type, "FieldId": id}})
+
+			if f_type == 4: #populate values for values list
+				self.vl_name_to_vl_id.update({name: field["RequestedObject"]["RelatedValuesListId"]})
+
+			elif f_type == 24: #populate fileds from subforms, up to text fields
+				subform_ids_by_name.update({name: field["RequestedObject"]["RelatedSubformId"]})
+
+		self.application_level_id = str(level_id) # set the application ID, I found it here
+
+		return subform_ids_by_name
 
 	def get_subform_fields_by_id(self, sub_form_id):
 		"""
@@ -252,24 +656,34 @@ class ArcherInstance:
 				sub_form_id) + "?$filter=IsActive eq true"
 
 		try:
-			response = requests.get(api_url, headers=self.header, verify=False)
+			response = self.request("GET", api_url, headers=self.header)
 			data = json.loads(response.content.decode("utf-8"))
-			subform_fields_names = {}
-			fields_ids = []
-			for field in data:
-				f_name = field["RequestedObject"]["Name"]
-				id = field["RequestedObject"]["Id"]
-				f_type = field["RequestedObject"]["Type"]
-				level_id = field["RequestedObject"]["LevelId"]
-				fields_ids.append(id)
-				subform_fields_names.update({f_name: id})
-				subform_fields_names.update({"LevelId": level_id})
-				subform_fields_names.update({id: {"Type": f_type, "FieldId": id}})
-			return subform_fields_names, fields_ids
+			return self.parse_subform_fields(data)
 
 		except Exception as e:
 			log.error("Function get_subform_fields_by_id didn't work, %s", e)
 
+	def parse_subform_fields(self, data):
+		"""
+		:param data: response of core/system/fielddefinition/application/{sub_form_id}
+		:return: {{name:id}, {id: {"Type": f_type, "FieldId": id}, {"LevelId": level_id},
+				 {"ValuesListIds": {values list field name: values list id}}}, [id1, id2, ...]
+		"""
+		subform_fields_names = {"ValuesListIds": {}}
+		fields_ids = []
+		for field in data:
+			f_name = field["RequestedObject"]["Name"]
+			id = field["RequestedObject"]["Id"]
+			f_type = field["RequestedObject"]["Type"]
+			level_id = field["RequestedObject"]["LevelId"]
+			fields_ids.append(id)
+			subform_fields_names.update({f_name: id})
+			subform_fields_names.update({"LevelId": level_id})
+			subform_fields_names.update({id: {"Type": f_type, "FieldId": id}})
+			if f_type == 4:
+				subform_fields_names["ValuesListIds"][f_name] = field["RequestedObject"]["RelatedValuesListId"]
+		return subform_fields_names, fields_ids
+
 	def get_vl_id_by_field_name(self, vl_field_name):
 		"""
 		:param vl_field_name: values list name
@@ -277,23 +691,74 @@ class ArcherInstance:
 		"""
 		return self.vl_name_to_vl_id[vl_field_name]
 
-	def get_value_id_by_field_name_and_value(self,field_name, value):
-		values_list_id = self.get_vl_id_by_field_name(field_name)
+	def get_values_list(self, values_list_id):
+		"""
+		:param values_list_id: internal values list id
+		:return: ValuesList object, downloaded once and then taken from self.values_list_cache
+		"""
+		values_list = self.values_list_cache.get(values_list_id)
+		if values_list:
+			return values_list
+
 		api_url = self.api_url_base + "core/system/valueslistvalue/flat/valueslist/" + str(values_list_id)
 
 		try:
-			response = requests.get(api_url, headers=self.header, verify=False)
+			response = self.request("GET", api_url, headers=self.header)
 			data = json.loads(response.content.decode("utf-8"))
 
-			for ind_value in data:
-				if  ind_value["RequestedObject"]["Name"]== value:
-					ret_arr = []
-					ret_arr.append(ind_value["RequestedObject"]["Id"])
-					return ret_arr
+			values_list = ValuesList(data)
+			self.values_list_cache.put(values_list_id, values_list)
+			return values_list
+
+		except Exception as e:
+			log.error("Function get_values_list didn't work, %s", e)
+
+	def get_value_id_by_field_name_and_value(self,field_name, value):
+		"""
+		:param field_name: values list field name how you see it in the app
+		:param value: "Value" or "Parent Value:Value" for leveled values list
+		:return: [value_id] or None
+		"""
+		values_list_id = self.get_vl_id_by_field_name(field_name)
+
+		try:
+			value_id = self.get_values_list(values_list_id).get_value_id(value)
+			if value_id is not None:
+				return [value_id]
 
 		except Exception as e:
 			log.error("Function get_value_id_by_field_name_and_value didn't work, %s", e)
 
+	def get_value_ids_by_field_name_and_values(self, field_name, values):
+		"""
+		:param field_name: values list field name how you see it in the app
+		:param values: ["Value", "Parent Value:Value", ...]
+		:return: [value_id1, value_id2, ...], values which are not found are skipped and logged
+		"""
+		values_list = self.get_values_list(self.get_vl_id_by_field_name(field_name))
+		value_ids = []
+
+		for value in values:
+			value_id = values_list.get_value_id(value)
+			if value_id is None:
+				log.error("Value %s is not found in values list %s", value, field_name)
+			else:
+				value_ids.append(value_id)
+
+		return value_ids
+
+	def resolve_values_list_names(self, field_name, value_content):
+		"""
+		:param field_name: values list field name how you see it in the app
+		:param value_content: [id1, "Value", "Parent Value:Value"] or {"ValuesListIds": [...], "OtherText": None}
+		:return: same value_content where names of values are replaced with internal ids
+		"""
+		if not has_value_names(value_content):  # only ids, no need to download values list
+			return value_content
+
+		values_list = self.get_values_list(self.get_vl_id_by_field_name(field_name))
+		return values_list.resolve_value_names(value_content, field_name)
+
 	def get_field_id_by_name(self, field_name, sub_form_name=None):
 		"""
 		:param sub_form_name: Add only if you need id of a subform of application, how you see it on the app
@@ -305,6 +770,38 @@ class ArcherInstance:
 		else:
 			return self.application_fields_json[f"{field_name}"]
 
+	def get_record_schema(self, level_id=None):
+		"""
+		:param level_id: LevelId of the record, application level by default
+		:return: RecordSchema shared by all records of the application or of the subform with this level id
+		"""
+		key = str(level_id) if level_id is not None else str(self.application_level_id)
+		schema = self.record_schemas.get(key)
+		if schema is None:
+			if key == str(self.application_level_id):
+				schema = RecordSchema(get_schema_fields(self.application_fields_json, self.all_application_fields_array,
+														self.vl_name_to_vl_id))
+			else:
+				subforms = self.subforms_json_by_sf_name.values()
+				fields_json = next((fields_json for fields_json in subforms if str(fields_json.get("LevelId")) == key), {})
+				schema = RecordSchema(get_schema_fields(fields_json, fields_json.get("AllFields") or [],
+														fields_json.get("ValuesListIds") or {}))
+			schema = self.record_schemas.setdefault(key, schema)
+		return schema
+
+	def get_field_ids_by_names(self, fields=None, sub_form_name=None):
+		"""
+		:param fields: [field name1, field name2, ...] how you see them in app
+		:param sub_form_name: Add only if fields belong to a subform of application
+		:return: [field_id1, field_id2, ...], all active fields of application (or subform) if fields are not provided
+		"""
+		if not fields:
+			if sub_form_name:
+				return self.subforms_json_by_sf_name[sub_form_name]["AllFields"]
+			return self.all_application_fields_array
+
+		return [self.get_field_id_by_name(field_name, sub_form_name) for field_name in fields]
+
 	def add_value_to_field(self, id, value_content):
 		"""
 		:param id: uniques internal Archer field_id
@@ -314,43 +811,92 @@ class ArcherInstance:
 		template_for_field_update["Value"] = value_content
 		return template_for_field_update
 
+	def build_content_record_body(self, fields_json, record_id=None):
+		"""
+		:param fields_json: see create_content_record()
+		:param record_id: internal archer id if the record is updated
+		:return: json string for core/content/
+		"""
+		transformed_json = {}
+		for key in fields_json.keys():
+			current_key_id = self.get_field_id_by_name(key)
+			value_content = fields_json[key]
+			if key in self.vl_name_to_vl_id:
+				value_content = self.resolve_values_list_names(key, value_content)
+			transformed_json[current_key_id] = self.add_value_to_field(current_key_id, value_content)
+
+		if record_id:
+			return json.dumps({"Content": {"Id": record_id, "LevelId": self.application_level_id,
+										   "FieldContents": transformed_json}})
+		return json.dumps({"Content": {"LevelId": self.application_level_id, "FieldContents": transformed_json}})
+
+	def build_sub_record_body(self, fields_json, subform_name):
+		"""
+		:param fields_json: see create_sub_record()
+		:param subform_name: how you see it in the app
+		:return: json string for core/content/
+		"""
+		subform_field_id = self.get_field_id_by_name(subform_name)
+		subform_level_id = self.subforms_json_by_sf_name[subform_name]["LevelId"]
+
+		transformed_json = {}
+		for key in fields_json.keys():
+			current_id = self.subforms_json_by_sf_name[subform_name][key]
+			current_json = dict(self.subforms_json_by_sf_name[subform_name][current_id])
+			current_json["Value"] = fields_json[key]
+			transformed_json.update({current_id: current_json})
+
+		return json.dumps({"Content": {"LevelId": subform_level_id, "FieldContents": transformed_json},
+						   "SubformFieldId": subform_field_id})
+
+	def prepare_record_writer(self, field_names, json_backend=None):
+		"""
+		:param field_names: [field name how you see it in the app, ...]
+		:param json_backend: "orjson" or "json", orjson is used by default when it's installed
+		:return: RecordWriter object, use it when many records with the same fields are saved
+		"""
+		return RecordWriter(self, field_names, json_backend)
+
 	def create_content_record(self, fields_json, record_id=None):
 		"""
 		:param fields_json: {field name how you see it in the app: value content
-										(for text it text, for others it's internal unique ids)}
+										(for text it text, for values list it's names of values or internal ids,
+										for others it's internal unique ids)}
 		:param record_id:
 		:returns int - record_id
 		"""
+		try:
+			body = self.build_content_record_body(fields_json, record_id)
+			return self.send_content_record(body, record_id)
+
+		except Exception as e:
+			log.info("Function create_content_record didn't work, %s", e)
+
+	def send_content_record(self, body, record_id=None):
+		"""
+		:param body: json string from build_content_record_body()
+		:param record_id: internal archer id if the record is updated
+		:returns int - record_id, raises RuntimeError with Archer validation messages if the record is not saved
+		"""
 		api_url = f"{self.api_url_base}core/content/"
 		post_header = dict(self.header)
-
-		transformed_json = {}
-		for key in fields_json.keys():
-			current_key_id = self.get_field_id_by_name(key)
-			transformed_json[current_key_id] = self.add_value_to_field(current_key_id, fields_json[key])
+		post_header["X-Http-Method-Override"] = "PUT" if record_id else "POST"
 
 		if record_id:
-			post_header["X-Http-Method-Override"] = "PUT"
-			body = json.dumps({"Content": {"Id": record_id, "LevelId": self.application_level_id,
-										   "FieldContents": transformed_json}})
+			response = self.request("PUT", api_url, headers=post_header, data=body)
 		else:
-			post_header["X-Http-Method-Override"] = "POST"
-			body = json.dumps({"Content": {"LevelId": self.application_level_id, "FieldContents": transformed_json}})
+			response = self.request("POST", api_url, headers=post_header, data=body)
+		data = json.loads(response.content.decode("utf-8"))
 
-		try:
-			if record_id:
-				response = requests.put(api_url, headers=post_header, data=body, verify=False)
-				data = json.loads(response.content.decode("utf-8"))
-				log.info("Record updated, %s", data["RequestedObject"]["Id"])
-			else:
-				response = requests.post(api_url, headers=post_header, data=body, verify=False)
-				data = json.loads(response.content.decode("utf-8"))
-				log.info("Function create_content_record created record, %s", data["RequestedObject"]["Id"])
+		if not data.get("RequestedObject"):
+			raise RuntimeError(f"Archer returned status {response.status_code}: {data.get('ValidationMessages')}")
 
-			return data["RequestedObject"]["Id"]
+		if record_id:
+			log.info("Record updated, %s", data["RequestedObject"]["Id"])
+		else:
+			log.info("Function create_content_record created record, %s", data["RequestedObject"]["Id"])
 
-		except Exception as e:
-			log.info("Function create_content_record didn't work, %s", e)
+		return data["RequestedObject"]["Id"]
 
 	def create_sub_record(self, fields_json, subform_name):
 		"""LevelID is an application
@@ -362,22 +908,10 @@ class ArcherInstance:
 		api_url = f"{self.api_url_base}core/content/"
 		post_header = dict(self.header)
 		post_header["X-Http-Method-Override"] = "POST"
-
-		subform_field_id = self.get_field_id_by_name(subform_name)
-
-		transformed_json = {}
-		for key in fields_json.keys():
-			current_id = self.subforms_json_by_sf_name[subform_name][key]
-			current_json = dict(self.subforms_json_by_sf_name[subform_name][current_id])
-			current_json["Value"] = fields_json[key]
-			subform_level_id = self.subforms_json_by_sf_name[subform_name]["LevelId"]
-			transformed_json.update({current_id: current_json})
-
-		body = json.dumps({"Content": {"LevelId": subform_level_id, "FieldContents": transformed_json},
-						   "SubformFieldId": subform_field_id})
+		body = self.build_sub_record_body(fields_json, subform_name)
 
 		try:
-			response = requests.post(api_url, headers=post_header, data=body, verify=False)
+			response = self.request("POST", api_url, headers=post_header, data=body)
 			data = json.loads(response.content.decode("utf-8"))
 
 			log.info("Function create_sub_record created record, %s", data["RequestedObject"]["Id"])
@@ -387,6 +921,51 @@ class ArcherInstance:
 		except Exception as e:
 			log.error("Function create_sub_record didn't work, %s", e)
 
+	def create_record_with_sub_records(self, fields_json, sub_records_json, record_id=None, workers=8):
+		"""
+		Creates sub records of all subforms concurrently, then creates (or updates) the parent record with their ids.
+		If any sub record or the parent record is not saved, created sub records are deleted.
+		:param fields_json: see create_content_record(), ids of existing sub records could be provided
+							for subform fields, new ids are added after them
+		:param sub_records_json: {subform name how you see it in the app: [sub record fields_json, ...]},
+							see create_sub_record()
+		:param record_id: internal archer id, if provided the record is updated
+		:param workers: number of sub records created at the same time
+		:returns int - record_id or None
+		"""
+		sub_records = [(subform_name, sub_record_json) for subform_name, rows in sub_records_json.items()
+					   for sub_record_json in rows]
+
+		sub_record_ids = []
+
+		try:
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				futures = [executor.submit(self.create_sub_record, sub_record_json, subform_name)
+						   for subform_name, sub_record_json in sub_records]
+				for future in futures:
+					try:
+						sub_record_ids.append(future.result())
+					except Exception as e:  # e.g. unknown field name, the row is not created
+						log.error("Sub record is not created, %s", e)
+						sub_record_ids.append(None)
+
+			failed = sub_record_ids.count(None)
+			if failed:
+				raise RuntimeError(f"{failed} of {len(sub_records)} sub records are not created")
+
+			parent_json = dict(fields_json)
+			for (subform_name, sub_record_json), sub_record_id in zip(sub_records, sub_record_ids):
+				parent_json[subform_name] = list(parent_json.get(subform_name) or []) + [sub_record_id]
+
+			body = self.build_content_record_body(parent_json, record_id)
+			return self.send_content_record(body, record_id)
+
+		except Exception as e:
+			created_ids = [sub_record_id for sub_record_id in sub_record_ids if sub_record_id]
+			log.error("Function create_record_with_sub_records didn't work, deleting sub records %s, %s", created_ids, e)
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				list(executor.map(self.delete_record, created_ids))
+
 	def delete_record(self, record_id=None):
 		"""
 		:param record_id:
@@ -402,7 +981,7 @@ class ArcherInstance:
 
 		try:
 			if record_id:
-				response = requests.delete(api_url, headers=post_header, data=body, verify=False)
+				response = self.request("DELETE", api_url, headers=post_header, data=body)
 				data = json.loads(response.content.decode("utf-8"))
 				log.info("Function delete_content_record deleted record")
 			else:
@@ -423,7 +1002,7 @@ class ArcherInstance:
 		body = json.dumps({"AttachmentName": name, "AttachmentBytes": base64_string})
 
 		try:
-			response = requests.post(api_url, headers=post_header, data=body, verify=False)
+			response = self.request("POST", api_url, headers=post_header, data=body)
 			data = response.json()
 
 			log.info("Attachment %s posted to Archer", data["RequestedObject"]["Id"])
@@ -432,6 +1011,89 @@ class ArcherInstance:
 		except Exception as e:
 			log.error("Function post_attachment didn't work, %s; Response content: %s", e, response.content)
 
+	def post_attachment_file(self, file, name=None, chunk_size=ATTACHMENT_CHUNK_SIZE):
+		"""
+		Uploads the file without loading it into memory, it's base64 encoded by chunks while the body is sent
+		:param file: path to the file or binary file object opened for reading
+		:param name: name of the attachment, file name by default
+		:param chunk_size: bytes of the file encoded at once
+		:return: attachment id
+		"""
+		api_url = f"{self.api_url_base}core/content/attachment"
+		post_header = dict(self.header)
+		post_header["X-Http-Method-Override"] = "POST"
+
+		file_object = open(file, "rb") if isinstance(file, (str, os.PathLike)) else file
+		if name is None:
+			name = os.path.basename(getattr(file_object, "name", None) or "attachment")
+
+		try:
+			start = file_object.tell() if hasattr(file_object, "seekable") and file_object.seekable() else None
+			for attempt in range(2):
+				used_token = get_header_token(post_header)
+				body = AttachmentUploadStream(name, file_object, chunk_size=chunk_size)
+				# body can't be sent twice, so expired token is refreshed here and not in request()
+				response = self.request("POST", api_url, headers=post_header, refresh_token=False,
+										data=body if body.length is not None else iter(body))
+				if response.status_code != 401 or start is None or attempt:
+					break
+				self.refresh_session_token(used_token)
+				post_header["Authorization"] = self.header["Authorization"]
+				file_object.seek(start)
+
+			data = response.json()
+
+			log.info("Attachment %s posted to Archer", data["RequestedObject"]["Id"])
+			return data["RequestedObject"]["Id"]
+
+		except Exception as e:
+			log.error("Function post_attachment_file didn't work for %s, %s", name, e)
+
+		finally:
+			if file_object is not file:
+				file_object.close()
+
+	def download_attachment(self, attachment_id, file, chunk_size=1024 * 1024):
+		"""
+		Downloads the attachment without loading it into memory, content is decoded while it's received
+		:param attachment_id: internal archer attachment id
+		:param file: path where the file is saved or binary file object opened for writing
+		:param chunk_size: bytes of the response read at once
+		:return: attachment name
+		"""
+		api_url = f"{self.api_url_base}core/content/attachment/{attachment_id}"
+		path = file if isinstance(file, (str, os.PathLike)) else None
+		file_object = None
+
+		try:
+			response = self.request("GET", api_url, headers=self.header, stream=True)
+			try:
+				if response.status_code != 200:
+					raise RuntimeError(f"Archer returned status {response.status_code}")
+
+				# content is written next to the target and moved there only when it's complete
+				file_object = open(f"{path}.part", "wb") if path else file
+				data = write_attachment_content(response.iter_content(chunk_size), file_object)
+			finally:
+				response.close()
+
+			if not data.get("RequestedObject"):
+				raise RuntimeError(f"Attachment is not returned: {data.get('ValidationMessages')}")
+
+			if path:
+				file_object.close()
+				os.replace(f"{path}.part", path)
+
+			log.info("Attachment %s downloaded", attachment_id)
+			return data["RequestedObject"].get("AttachmentName")
+
+		except Exception as e:
+			log.error("Function download_attachment didn't work for attachment %s, %s", attachment_id, e)
+			if path and file_object:
+				file_object.close()
+				if os.path.exists(f"{path}.part"):
+					os.remove(f"{path}.part")
+
 	def update_content_record(self, updated_json, record_id):
 		"""LevelID is an application
 		:param updated_json: see function create_content_record()
@@ -440,20 +1102,80 @@ class ArcherInstance:
 		"""
 		return self.create_content_record(updated_json, record_id)
 
-	def get_record(self, record_id):
+	def bulk_upsert(self, records, key_field=None, prefix=None, workers=8, rate_limit=None):
+		"""
+		Creates or updates many records concurrently. Payloads are translated before sending,
+		records with the same key are sent one after another, so the first creates the record and the next update it.
+		:param records: iterable of fields_json, see create_content_record()
+		:param key_field: field with unique value, the record is updated if its value is in key_field_value_to_system_id
+						 (see build_unique_value_to_id_mapping()), otherwise created and added to the mapping
+		:param prefix: see build_unique_value_to_id_mapping()
+		:param workers: number of records sent at the same time
+		:param rate_limit: max number of records sent per second, no limit by default
+		:return: [{"index": position in records, "key": key value, "id": record_id, "status": "created", "updated" or "failed",
+				   "error": None or error message}, ...] in the order of records
+		"""
+		records = list(records)
+		results = [{"index": index, "key": None, "id": None, "status": "failed", "error": None}
+				   for index in range(len(records))]
+		limiter = RateLimiter(rate_limit) if rate_limit else None
+
+		field_names = {}
+		for fields_json in records:
+			field_names.update(dict.fromkeys(fields_json))
+		# unknown fields are left out here and fail only their own records
+		writer = self.prepare_record_writer([name for name in field_names if name in self.application_fields_json])
+
+		indexes_by_key = {}
+		for index, fields_json in enumerate(records):
+			if key_field and fields_json.get(key_field) is not None:
+				key = (prefix or "") + str(fields_json[key_field])
+				results[index]["key"] = key
+			else:
+				key = ("no key", index)
+			indexes_by_key.setdefault(key, []).append(index)
+
+		def upsert(index):
+			result = results[index]
+			try:
+				record_id = self.get_record_id_by_unique_value(result["key"]) if result["key"] else None
+				body = writer.build_body(records[index], record_id or None)
+				if limiter:
+					limiter.acquire()
+
+				result["id"] = self.send_content_record(body, record_id or None)
+				result["status"] = "updated" if record_id else "created"
+				if not record_id and result["key"]:
+					self.add_record_id_to_mapping(result["key"], result["id"])
+
+			except Exception as e:
+				result["error"] = f"{e.__class__.__name__}: {e}"
+				log.error("Record %s is not saved, %s", result["key"] or index, e)
+
+		def upsert_group(indexes):
+			for index in indexes:
+				upsert(index)
+
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			list(executor.map(upsert_group, indexes_by_key.values()))
+
+		return results
+
+	def get_record(self, record_id, fields=None):
 		"""
 		:param record_id: internal archer record id
+		:param fields: [field name1, field name2, ...] to get only these fields, all active fields by default
 		:return: record object
 		"""
 		api_url = f"{self.api_url_base}core/content/fieldcontent/"
 		cont_id = [str(record_id)]
-		body = json.dumps({"FieldIds": self.all_application_fields_array, "ContentIds": cont_id})
+		body = json.dumps({"FieldIds": self.get_field_ids_by_names(fields), "ContentIds": cont_id})
 
 		post_header = dict(self.header)
 		post_header["X-Http-Method-Override"] = "POST"
 
 		try:
-			response = requests.post(api_url, headers=post_header, data=body, verify=False)
+			response = self.request("POST", api_url, headers=post_header, data=body, idempotent=True)
 			data = json.loads(response.content.decode("utf-8"))
 
 			return Record(self, data[0]["RequestedObject"])
@@ -461,22 +1183,23 @@ class ArcherInstance:
 		except Exception as e:
 			log.error("Function get_record() didn't work, %s", e)
 
-	def get_sub_record(self, sub_record_id, sub_record_name):
+	def get_sub_record(self, sub_record_id, sub_record_name, fields=None):
 		"""
 		:param sub_record_id:
 		:param sub_record_name:
+		:param fields: [subform field name1, ...] to get only these fields, all active subform fields by default
 		:return: record object
 		"""
 		api_url = f"{self.api_url_base}core/content/fieldcontent/"
 		cont_id = [str(sub_record_id)]
-		all_fields_arr = self.subforms_json_by_sf_name[sub_record_name]["AllFields"]
+		all_fields_arr = self.get_field_ids_by_names(fields, sub_record_name)
 		body = json.dumps({"FieldIds": all_fields_arr, "ContentIds": cont_id})
 
 		post_header = dict(self.header)
 		post_header["X-Http-Method-Override"] = "POST"
 
 		try:
-			response = requests.post(api_url, headers=post_header, data=body, verify=False)
+			response = self.request("POST", api_url, headers=post_header, data=body, idempotent=True)
 			data = json.loads(response.content.decode("utf-8"))
 
 			return Record(self, data[0]["RequestedObject"])
@@ -484,6 +1207,164 @@ class ArcherInstance:
 		except Exception as e:
 			log.error("Function get_sub_record() didn't work, %s", e)
 
+	def get_field_contents(self, field_ids, record_ids, chunk_size=100, workers=1):
+		"""
+		Packs many record ids into one core/content/fieldcontent/ call
+		:param field_ids: [field_id1, field_id2, ...]
+		:param record_ids: iterable of internal archer record ids
+		:param chunk_size: number of record ids sent in one request
+		:param workers: number of requests sent at the same time, records are still yielded in order of record_ids
+		:return: generator of record jsons {'Id': 305943, 'LevelId': 67, 'SequentialId': 2, 'FieldContents': {...}}
+		"""
+		record_ids = iter(record_ids)
+		chunks = iter(lambda: [str(record_id) for record_id in islice(record_ids, chunk_size)], [])
+
+		if workers <= 1:
+			for cont_ids in chunks:
+				yield from self.get_field_contents_chunk(field_ids, cont_ids)
+			return
+
+		# only a few next chunks are downloaded while the current one is consumed, so memory doesn't grow
+		pending = deque()
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			for cont_ids in chunks:
+				pending.append(executor.submit(self.get_field_contents_chunk, field_ids, cont_ids))
+				if len(pending) > workers:
+					yield from pending.popleft().result()
+			while pending:
+				yield from pending.popleft().result()
+
+	def get_field_contents_chunk(self, field_ids, cont_ids):
+		"""
+		:param field_ids: [field_id1, field_id2, ...]
+		:param cont_ids: ["record id1", "record id2", ...], sent in one request
+		:return: list of record jsons, records not returned by Archer are logged and skipped
+		"""
+		api_url = f"{self.api_url_base}core/content/fieldcontent/"
+		post_header = dict(self.header)
+		post_header["X-Http-Method-Override"] = "POST"
+		body = json.dumps({"FieldIds": field_ids, "ContentIds": cont_ids})
+
+		try:
+			response = self.request("POST", api_url, headers=post_header, data=body, idempotent=True)
+			data = json.loads(response.content.decode("utf-8"))
+
+		except Exception as e:
+			log.error("Function get_field_contents() didn't work for records %s, %s", cont_ids, e)
+			return []
+
+		records = []
+		for record in data:
+			if record.get("RequestedObject"):
+				records.append(record["RequestedObject"])
+			else:
+				log.error("Record is not returned by Archer, %s", record.get("ValidationMessages"))
+		return records
+
+	def get_records(self, record_ids, chunk_size=100, fields=None, workers=1):
+		"""
+		:param record_ids: iterable of internal archer record ids
+		:param chunk_size: number of records requested in one call
+		:param fields: [field name1, field name2, ...] to get only these fields, all active fields by default
+		:param workers: number of calls sent at the same time, records are still yielded in order
+		:return: generator of record objects
+		"""
+		field_ids = self.get_field_ids_by_names(fields)
+		for record_json in self.get_field_contents(field_ids, record_ids, chunk_size, workers):
+			yield Record(self, record_json)
+
+	def get_sub_records(self, sub_record_ids, sub_record_name, chunk_size=100, fields=None):
+		"""
+		:param sub_record_ids: iterable of internal archer sub record ids
+		:param sub_record_name: subform name how you see it in the app
+		:param chunk_size: number of sub records requested in one call
+		:param fields: [subform field name1, ...] to get only these fields, all active subform fields by default
+		:return: generator of record objects
+		"""
+		all_fields_arr = self.get_field_ids_by_names(fields, sub_record_name)
+		for record_json in self.get_field_contents(all_fields_arr, sub_record_ids, chunk_size):
+			yield Record(self, record_json)
+
+	def get_related_records(self, records, field_name, fields=None, chunk_size=100, workers=1):
+		"""
+		Gets sub records, cross-referenced or related records of many records with batched fieldcontent calls
+		instead of one get_sub_record() call per id, every referenced record is downloaded once
+		:param records: iterable of record objects
+		:param field_name: subform, cross-reference or related records field name how you see it in the app
+		:param fields: subform field names, all active subform fields by default; for cross-reference and related
+					   records fields [field_id1, field_id2, ...] of the referenced application are required
+		:param chunk_size: number of records requested in one call
+		:param workers: number of calls sent at the same time
+		:return: {record id: [record object, ...]} in the order of references, records not returned by Archer are skipped
+		"""
+		references, record_ids = self.get_related_record_ids(records, field_name)
+		related = {}
+		for record_json in self.get_field_contents(self.get_related_field_ids(field_name, fields), record_ids,
+												   chunk_size, workers):
+			related[record_json["Id"]] = Record(self, record_json)
+
+		return {record_id: [related[related_id] for related_id in related_ids if related_id in related]
+				for record_id, related_ids in references.items()}
+
+	def get_related_record_ids(self, records, field_name):
+		"""
+		:param records: iterable of record objects
+		:param field_name: subform, cross-reference or related records field name how you see it in the app
+		:return: {record id: [related record id, ...]}, [unique related record ids]
+		"""
+		references = {record.id: record.get_field_content(field_name) or [] for record in records}
+		record_ids = list(dict.fromkeys(related_id for related_ids in references.values() for related_id in related_ids))
+		return references, record_ids
+
+	def get_related_field_ids(self, field_name, fields=None):
+		"""
+		:param field_name: subform, cross-reference or related records field name how you see it in the app
+		:param fields: see get_related_records()
+		:return: [field_id1, field_id2, ...] requested for the related records
+		"""
+		if field_name in self.subforms_json_by_sf_name:
+			return self.get_field_ids_by_names(fields, field_name)
+		if not fields:
+			raise ValueError(f"Field ids of the application referenced by {field_name} are required")
+		return [int(field_id) for field_id in fields]
+
+	def export_application(self, path, endpoint_url=None, record_ids=None, fields=None, format=None, workers=4,
+						   chunk_size=100, resolve_users=True):
+		"""
+		Streams records of the selected application (see from_application()) to NDJSON, CSV or Parquet file,
+		only a few chunks of records are in memory at any time
+		:param path: output file
+		:param endpoint_url: GRC endpoint of the application, ids of all its records are taken from it
+		:param record_ids: iterable of internal archer record ids to export instead of all records of endpoint_url
+		:param fields: [field name1, field name2, ...], all fields by default
+		:param format: "ndjson", "csv" or "parquet", taken from the file extension by default
+		:param workers: number of fieldcontent calls sent at the same time
+		:param chunk_size: number of records requested in one call
+		:param resolve_users: user fields are exported as display names, otherwise as user ids
+		:return: number of exported records
+		"""
+		if record_ids is None:
+			if not endpoint_url:
+				raise ValueError("Provide endpoint_url or record_ids")
+			id_field = endpoint_url + "_Id"
+			record_ids = (record[id_field] for record in
+						  self.iter_grc_endpoint_records(endpoint_url, select=[id_field], workers=2))
+
+		decoder = RecordRowDecoder(self, fields, resolve_users)
+		record_jsons = self.get_field_contents(decoder.field_ids, record_ids, chunk_size, workers)
+		writer = open_export_writer(path, decoder.columns, format)
+		count = 0
+
+		try:
+			for chunk in iter(lambda: list(islice(record_jsons, chunk_size)), []):
+				writer.write_rows(decoder.decode(chunk))
+				count += len(chunk)
+		finally:
+			writer.close()
+
+		log.info("Exported %s records to %s", count, path)
+		return count
+
 # THIS PART IS USING ARCHER GRC API, NOT REST API USED ABOVE
 
 	def find_grc_endpoint_url(self, app_name):
@@ -494,7 +1375,7 @@ class ArcherInstance:
 				 For all grc_api calls use the name you get.
 		"""
 
-		response = requests.get(self.content_api_url_base, headers=self.header, verify=False)
+		response = self.request("GET", self.content_api_url_base)
 		data = json.loads(response.content.decode("utf-8"))
 
 		print("I've found the following: ")
@@ -503,20 +1384,47 @@ class ArcherInstance:
 			if app_name in endpoint["name"]:
 				print("endpoint_url: ", endpoint["url"])
 
-	def get_grc_endpoint_records(self, endpoint_url, skip=None):
+	def build_grc_endpoint_url(self, endpoint_url, skip=None, select=None, filter=None, orderby=None, top=None):
+		"""
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param skip: number of records to skip
+		:param select: [field1, field2, ...] or "field1,field2", only these columns are returned
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param orderby: [field1, "field2 desc", ...] or "field1,field2 desc"
+		:param top: max number of records returned
+		:return: full url of the content api call
+		"""
+		options = []
+		if skip:
+			options.append("$skip=" + str(skip))
+		if top is not None:
+			options.append("$top=" + str(top))
+		if select:
+			options.append("$select=" + quote_odata_option(select if isinstance(select, str) else ",".join(select)))
+		if filter:
+			options.append("$filter=" + quote_odata_option(filter))
+		if orderby:
+			options.append("$orderby=" + quote_odata_option(orderby if isinstance(orderby, str) else ",".join(orderby)))
+
+		api_url = self.content_api_url_base + endpoint_url
+		if options:
+			api_url += "?" + "&".join(options)
+		return api_url
+
+	def get_grc_endpoint_records(self, endpoint_url, skip=None, select=None, filter=None, orderby=None, top=None):
 		"""
 		By default gets 1000 records from the endpoint.
 		:param endpoint_url: get from find_grc_endpoint_url()
-		:param skip: number of records to skip in thousands (1,2,3)
+		:param skip: number of records to skip (1000, 2000, 3000)
+		:param select: [field1, field2, ...], only these columns are returned
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param orderby: [field1, "field2 desc", ...]
+		:param top: max number of records returned, up to 1000
 		:return: array of record jsons
 		"""
-		if skip:
-			api_url = self.content_api_url_base + endpoint_url + "?$skip=" + str(skip)
-
-		else:
-			api_url = self.content_api_url_base + endpoint_url
+		api_url = self.build_grc_endpoint_url(endpoint_url, skip, select, filter, orderby, top)
 
-		response = requests.get(api_url, headers=self.header, verify=False)
+		response = self.request("GET", api_url, headers=self.header)
 		data = json.loads(response.content.decode("utf-8"))
 		array_jsons = []
 
@@ -525,7 +1433,138 @@ class ArcherInstance:
 
 		return array_jsons
 
-	def build_unique_value_to_id_mapping(self, endpoint_url, key_value_field=None, prefix=None):
+	def get_grc_endpoint_records_count(self, endpoint_url, filter=None):
+		"""
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param filter: OData filter, count only matching records
+		:return: number of records in the endpoint or None if content api doesn't support $count
+		"""
+		api_url = self.build_grc_endpoint_url(endpoint_url + "/$count", filter=filter)
+
+		try:
+			response = self.request("GET", api_url, headers=self.header)
+			if response.status_code != 200:
+				log.debug("$count is not supported for %s, status %s", endpoint_url, response.status_code)
+				return None
+			return int(response.content.decode("utf-8-sig").strip())
+
+		except Exception as e:
+			log.debug("$count is not supported for %s, %s", endpoint_url, e)
+			return None
+
+	def iter_grc_endpoint_pages(self, endpoint_url, select=None, filter=None, workers=4, orderby=None, top=None):
+		"""
+		Yields pages of the endpoint in order, up to workers next pages are downloaded while the current one is consumed.
+		Total is discovered with $count, if it's not supported pages are requested until the page with less than 1000 records.
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param select: [field1, field2, ...], only these columns are returned
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param workers: max number of pages downloaded at the same time
+		:param orderby: [field1, "field2 desc", ...], use it to keep paging stable while records are changed
+		:param top: max number of records returned in all pages
+		:return: generator of arrays of record jsons
+		"""
+		def page_size(skip):
+			return GRC_PAGE_SIZE if top is None else min(GRC_PAGE_SIZE, top - skip)
+
+		def get_page(skip):
+			return self.get_grc_endpoint_records(endpoint_url, skip, select, filter, orderby,
+												 None if top is None else page_size(skip))
+
+		first_page = get_page(0)
+		yield first_page
+		if len(first_page) < page_size(0) or len(first_page) == top:
+			return
+
+		total = self.get_grc_endpoint_records_count(endpoint_url, filter)
+		if top is not None:
+			total = top if total is None else min(total, top)
+		next_skip = GRC_PAGE_SIZE
+		pending = deque()
+
+		with ThreadPoolExecutor(max_workers=workers) as executor:
+			while True:
+				# after the known total only one page is checked, records could be added after $count
+				while len(pending) < workers and (total is None or next_skip < total or not pending):
+					if top is not None and next_skip >= top:
+						break
+					pending.append((next_skip, executor.submit(get_page, next_skip)))
+					next_skip += GRC_PAGE_SIZE
+
+				if not pending:
+					return
+
+				skip, future = pending.popleft()
+				page = future.result()
+				yield page
+				if len(page) < page_size(skip):
+					for pending_skip, pending_future in pending:
+						pending_future.cancel()
+					return
+
+	def iter_grc_endpoint_records(self, endpoint_url, select=None, filter=None, workers=1, orderby=None, top=None):
+		"""
+		Same as get_all_grc_endpoint_records(), but yields records one by one and keeps only current pages in memory
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param select: [field1, field2, ...], only these columns are returned
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param workers: number of next pages prefetched while the current page is consumed
+		:param orderby: [field1, "field2 desc", ...]
+		:param top: max number of records returned
+		:return: generator of record jsons
+		"""
+		for page in self.iter_grc_endpoint_pages(endpoint_url, select, filter, workers, orderby, top):
+			yield from page
+
+	def get_all_grc_endpoint_records(self, endpoint_url, workers=4, select=None, filter=None, orderby=None, top=None):
+		"""
+		Gets all records of the endpoint, pages are downloaded concurrently and merged in order.
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param workers: max number of pages downloaded at the same time
+		:param select: [field1, field2, ...], only these columns are returned
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param orderby: [field1, "field2 desc", ...]
+		:param top: max number of records returned
+		:return: array of record jsons
+		"""
+		all_records = []
+		for page in self.iter_grc_endpoint_pages(endpoint_url, select, filter, workers, orderby, top):
+			all_records += page
+
+		return all_records
+
+	def export_grc_endpoint(self, endpoint_url, path, select=None, filter=None, format=None, workers=4):
+		"""
+		Streams records of the endpoint to NDJSON, CSV or Parquet file, only current and prefetched pages are in memory
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param path: output file
+		:param select: [field1, field2, ...], columns of CSV and Parquet are taken from the first page if not provided
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param format: "ndjson", "csv" or "parquet", taken from the file extension by default
+		:param workers: number of pages downloaded at the same time
+		:return: number of exported records
+		"""
+		writer = None
+		count = 0
+
+		try:
+			for page in self.iter_grc_endpoint_pages(endpoint_url, select, filter, workers):
+				if writer is None:
+					if select:
+						columns = select.split(",") if isinstance(select, str) else list(select)
+					else:
+						columns = list(page[0]) if page else []
+					writer = open_export_writer(path, columns, format)
+				writer.write_rows(page)
+				count += len(page)
+		finally:
+			if writer is not None:
+				writer.close()
+
+		log.info("Exported %s records of %s to %s", count, endpoint_url, path)
+		return count
+
+	def build_unique_value_to_id_mapping(self, endpoint_url, key_value_field=None, prefix=None, workers=4):
 		"""
 		:param endpoint_url: get from find_grc_endpoint_url()
 		:param key_value_field: name of the field with unique value that you
@@ -533,39 +1572,98 @@ class ArcherInstance:
 		:param prefix: adding prefix in front of key_value_field, sometimes in Archer
 		 				tranp_key fields are shown like INC-xxx, but in app they only have xxx,
 		 				so to solve that add prefix here, in our case it's INC-
+		:param workers: number of pages downloaded concurrently, see iter_grc_endpoint_pages()
 		:return: Populate Archer_Instance object with self.key_field_value_to_system_id with {field_value:content_record_id}
 		"""
-
-		i = 0
-		for_equal_numbers = 0  # breaks out of the loop if the number of records are equal to 1000
-		all_records = []
-
-		while True:
-			current_records = self.get_grc_endpoint_records(endpoint_url, i)
-			all_records += current_records
-			if len(current_records) != 1000 or for_equal_numbers > 21: # Attention, if records are more than 21000 increase the value
+		select = None
+		if key_value_field:  # download only the key field and record id instead of all columns
+			select = [key_value_field, endpoint_url + "_Id"]
+
+		for page in self.iter_grc_endpoint_pages(endpoint_url, select=select, workers=workers):
+			if not key_value_field:
+				if page:
+					print(page[0])
+					print('Please choose your key_field above: {"KEY_FIELD": "unique value"}')
 				break
 
-			i += 1000
-			for_equal_numbers += 1
-
-		for record in all_records:
-			if key_value_field:
-				if prefix:
-					field_value = prefix + str(record[key_value_field])
-				else:
-					field_value = str(record[key_value_field])
-
-				system_id = record[endpoint_url + "_Id"]
-				self.key_field_value_to_system_id.update({field_value: system_id})
-
-			else:
-				print(record)
-				print('Please choose your key_field above: {"KEY_FIELD": "unique value"}')
-				break
+			# one batch per page, so disk index is written in one transaction per page
+			self.key_field_value_to_system_id.update(
+				{(prefix or "") + str(record[key_value_field]): record[endpoint_url + "_Id"] for record in page})
 
 		log.info("Updated the mapping between record id and KEY_FIELD")
 
+	def sync_unique_value_to_id_mapping(self, endpoint_url, key_value_field, state_file, prefix=None,
+										updated_field=None, detect_deletions=True, workers=4):
+		"""
+		Incremental version of build_unique_value_to_id_mapping(), the mapping is kept in state_file together with
+		high-water mark, so next runs download only records changed since the previous run
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param key_value_field: see build_unique_value_to_id_mapping()
+		:param state_file: path of json file with the mapping, it's created by the first run
+		:param prefix: see build_unique_value_to_id_mapping()
+		:param updated_field: GRC name of last updated date field, e.g. "Last_Updated", records updated since the
+						previous run are downloaded; if it's not provided only records with greater id are downloaded
+		:param detect_deletions: download ids of all records (only id column) and drop deleted records from the mapping
+		:param workers: number of pages downloaded concurrently, see iter_grc_endpoint_pages()
+		:return: {"full": True if the whole mapping was built, "changed": records downloaded, "deleted": keys removed},
+				 self.key_field_value_to_system_id is updated in place
+		"""
+		id_field = endpoint_url + "_Id"
+		mark_field = updated_field or id_field
+		settings = {"endpoint_url": endpoint_url, "key_value_field": key_value_field, "prefix": prefix,
+					"updated_field": updated_field}
+
+		state = load_mapping_state(state_file)
+		full = not state or state["settings"] != settings
+		if full:
+			mapping, high_water_mark, filter = {}, None, None
+		else:
+			mapping, high_water_mark = state["mapping"], state["high_water_mark"]
+			self.key_field_value_to_system_id.update(mapping)
+			# records updated at the same time as the mark are downloaded again, so none of them is missed
+			filter = f"{mark_field} ge {format_odata_literal(high_water_mark)}" if high_water_mark is not None else None
+
+		keys_by_id = {system_id: key for key, system_id in mapping.items()}
+		select = [key_value_field, id_field] + ([updated_field] if updated_field else [])
+		result = {"full": full, "changed": 0, "deleted": 0}
+
+		for page in self.iter_grc_endpoint_pages(endpoint_url, select=select, filter=filter, workers=workers,
+												 orderby=[id_field]):
+			updates = {}
+			for record in page:
+				if record.get(key_value_field) is None:
+					continue
+				field_value = (prefix or "") + str(record[key_value_field])
+				system_id = record[id_field]
+
+				old_value = keys_by_id.get(system_id)
+				if old_value is not None and old_value != field_value:  # key of the record was changed
+					mapping.pop(old_value, None)
+					self.key_field_value_to_system_id.pop(old_value, None)
+				mapping[field_value] = system_id
+				keys_by_id[system_id] = field_value
+				updates[field_value] = system_id
+
+				mark = record.get(mark_field)
+				if mark is not None and (high_water_mark is None or mark > high_water_mark):
+					high_water_mark = mark
+				result["changed"] += 1
+
+			self.key_field_value_to_system_id.update(updates)
+
+		if detect_deletions and not full:
+			existing_ids = {record[id_field] for record in
+							self.iter_grc_endpoint_records(endpoint_url, select=[id_field], workers=workers)}
+			for field_value, system_id in list(mapping.items()):
+				if system_id not in existing_ids:
+					del mapping[field_value]
+					self.key_field_value_to_system_id.pop(field_value, None)
+					result["deleted"] += 1
+
+		save_mapping_state(state_file, settings, high_water_mark, mapping)
+		log.info("Synced the mapping between record id and %s, %s", key_value_field, result)
+		return result
+
 	def get_record_id_by_unique_value(self, key_value_field):
 		"""
 		:param key_value_field: field you used in build_unique_value_to_id_mapping()
@@ -576,6 +1674,17 @@ class ArcherInstance:
 		except:
 			return False
 
+	def get_record_ids_by_unique_values(self, key_values):
+		"""
+		Batched version of get_record_id_by_unique_value(), disk index looks up many keys in one query
+		:param key_values: iterable of key field values (with prefix)
+		:return: {key field value: record id} for found values
+		"""
+		index = self.key_field_value_to_system_id
+		if hasattr(index, "get_many"):
+			return index.get_many(key_values)
+		return {key: index[key] for key in key_values if key in index}
+
 	def add_record_id_to_mapping(self, key_value_field, system_id, prefix=None):
 		"""
 		:param key_value_field: field you used in build_unique_value_to_id_mapping()
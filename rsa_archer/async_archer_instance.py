@@ -0,0 +1,599 @@
+import asyncio
+import json
+import logging
+import time
+
+try:
+	import aiohttp
+except ImportError:  # optional dependency, pip install rsa_archer[async]
+	aiohttp = None
+
+from .archer_instance import ArcherInstance, GRC_PAGE_SIZE, RETRY_STATUSES, get_header_token, get_retry_delay
+from .key_mapping import DictKeyIndex
+from .metrics import RequestMetrics, get_body_size
+from .record import Record
+from .values_list_cache import ValuesList, ValuesListCache, has_value_names
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+log = logging.getLogger(__name__)
+
+
+class AsyncArcherInstance:
+	"""
+	Asyncio version of ArcherInstance, requests are sent with aiohttp and don't block the event loop.
+	Field names are translated by the same methods as in ArcherInstance.
+		:param inst_url - archer instance base url, without https://, could include port, e.g. "localhost:8080"
+		:param instance_name - archer instance name
+		:param username - of api user
+		:param password - of api user
+		:param max_concurrency - max number of requests in flight
+		:param max_retries - number of retries of idempotent calls on connection errors and 429/5xx responses
+		:param backoff_factor - sleep between retries is backoff_factor * (2 ** (retry number - 1)), if there is no Retry-After
+		:param values_list_cache_size - max number of values lists kept in memory
+		:param values_list_cache_ttl - seconds after which values list is downloaded again, None keeps it forever
+		:param metadata_cache - MetadataCache object, keeps application metadata on disk between runs of from_application()
+		:param metrics - RequestMetrics object, collects count, bytes and latency of calls per operation
+		:param scheme - "http" for a local test server, e.g. rsa_archer.tests.mock_archer
+		:param key_index - key field value to record id index, see ArcherInstance
+
+	Use it as "async with AsyncArcherInstance(...) as archer_instance:" or call login() and close() yourself.
+	Record objects returned by it read values lists and users from memory, so load them first with
+	load_values_lists() (from_application() does it by default) and load_users().
+	"""
+
+	def __init__(self, inst_url, instance_name, username, password, max_concurrency=100, max_retries=3,
+				 backoff_factor=0.3, values_list_cache_size=256, values_list_cache_ttl=3600, metadata_cache=None,
+				 metrics=None, scheme="https", key_index=None):
+		if aiohttp is None:
+			raise ImportError("AsyncArcherInstance needs aiohttp, install it with: pip install rsa_archer[async]")
+
+		self.api_url_base = f"{scheme}://{inst_url}/RSAarcher/api/"
+		self.content_api_url_base = f"{scheme}://{inst_url}/RSAarcher/contentapi/"
+		self.username = username
+		self.password = password
+		self.instance_name = instance_name
+
+		self.session_token = ""
+		self.header = ""
+
+		self.application_level_id = ""
+		self.application_fields_json = {}
+		self.all_application_fields_array = []
+		self.vl_name_to_vl_id = {}
+		self.subforms_json_by_sf_name = {}
+		self.record_schemas = {}  # {level id: RecordSchema}, see get_record_schema()
+		self.key_field_value_to_system_id = DictKeyIndex() if key_index is None else key_index
+		self.values_list_cache = ValuesListCache(values_list_cache_size, values_list_cache_ttl)
+		self.metadata_cache = metadata_cache
+		self.users_by_id = {}
+		self.metrics = metrics or RequestMetrics()
+
+		self.max_concurrency = max_concurrency
+		self.max_retries = max_retries
+		self.backoff_factor = backoff_factor
+		self.semaphore = None  # created in login() with login_lock, they must belong to the running event loop
+		self.login_lock = None
+		self.client_session = None
+
+	# field names, values and payloads are translated exactly like in ArcherInstance
+	get_metadata_cache_key = ArcherInstance.get_metadata_cache_key
+	get_application_metadata = ArcherInstance.get_application_metadata
+	set_application_metadata = ArcherInstance.set_application_metadata
+	parse_application_fields = ArcherInstance.parse_application_fields
+	parse_subform_fields = ArcherInstance.parse_subform_fields
+	get_vl_id_by_field_name = ArcherInstance.get_vl_id_by_field_name
+	get_value_id_by_field_name_and_value = ArcherInstance.get_value_id_by_field_name_and_value
+	get_value_ids_by_field_name_and_values = ArcherInstance.get_value_ids_by_field_name_and_values
+	resolve_values_list_names = ArcherInstance.resolve_values_list_names
+	get_field_id_by_name = ArcherInstance.get_field_id_by_name
+	get_record_schema = ArcherInstance.get_record_schema
+	get_related_record_ids = ArcherInstance.get_related_record_ids
+	get_related_field_ids = ArcherInstance.get_related_field_ids
+	get_field_ids_by_names = ArcherInstance.get_field_ids_by_names
+	add_value_to_field = ArcherInstance.add_value_to_field
+	build_content_record_body = ArcherInstance.build_content_record_body
+	build_sub_record_body = ArcherInstance.build_sub_record_body
+	build_grc_endpoint_url = ArcherInstance.build_grc_endpoint_url
+	get_operation_name = ArcherInstance.get_operation_name
+	get_user = ArcherInstance.get_user
+	get_record_id_by_unique_value = ArcherInstance.get_record_id_by_unique_value
+	get_record_ids_by_unique_values = ArcherInstance.get_record_ids_by_unique_values
+	add_record_id_to_mapping = ArcherInstance.add_record_id_to_mapping
+
+	async def __aenter__(self):
+		await self.login()
+		return self
+
+	async def __aexit__(self, exc_type, exc, tb):
+		await self.close()
+
+	async def login(self):
+		"""
+		Opens the client session and gets session token, could be invoked again to refresh the token
+		"""
+		if self.client_session is None:
+			connector = aiohttp.TCPConnector(limit=self.max_concurrency, ssl=False)
+			self.client_session = aiohttp.ClientSession(connector=connector)
+			self.semaphore = asyncio.Semaphore(self.max_concurrency)
+			self.login_lock = asyncio.Lock()
+
+		api_url = f"{self.api_url_base}core/security/login"
+		header = {"Accept": "application/json,text/html,application/xhtml+xml,application/xml;q =0.9,*/*;q=0.8",
+				  "Content-type": "application/json"}
+		try:
+			status, data = await self.request("POST", api_url, header, json.dumps(
+				{"InstanceName": self.instance_name, "Username": self.username, "UserDomain": "",
+				 "Password": self.password}), idempotent=True, refresh_token=False)
+
+			self.session_token = data["RequestedObject"]["SessionToken"]
+			self.header = {
+				"Accept": "application/json,text/html,application/xhtml+xml,application/xml;q =0.9,*/*;q=0.8",
+				"Content-type": "application/json",
+				"Authorization": "Archer session-id={0}".format(self.session_token),
+				"X-Http-Method-Override": "GET"}
+
+		except Exception as e:
+			log.error("Request for Archer session token failed, %s", e)
+
+	async def close(self):
+		"""
+		Closes all connections
+		"""
+		if self.client_session is not None:
+			await self.client_session.close()
+			self.client_session = None
+
+	async def request(self, method, api_url, headers=None, data=None, override=None, idempotent=None, refresh_token=True):
+		"""
+		All calls to Archer go through this method, expired token and retries are handled like in ArcherInstance.request()
+		:param method: GET, POST, PUT, DELETE
+		:param api_url: full url
+		:param headers: self.header by default
+		:param data: request body string
+		:param override: value of X-Http-Method-Override header
+		:param idempotent: safe to repeat, by default True for GET, PUT, DELETE and for POST with X-Http-Method-Override GET
+		:param refresh_token: False for the login call itself
+		:return: (status code, decoded json or None for empty response)
+		"""
+		headers = dict(self.header if headers is None else headers)
+		if override:
+			headers["X-Http-Method-Override"] = override
+		if idempotent is None:
+			idempotent = method in ("GET", "PUT", "DELETE") or headers.get("X-Http-Method-Override") == "GET"
+
+		operation = self.get_operation_name(method, api_url, headers)
+		started = time.monotonic()
+		token_refreshed = False
+		attempt = 0
+		attempts = 0
+		status = None
+		content = b""
+		error = None
+
+		try:
+			while True:
+				used_token = get_header_token(headers)
+				attempts += 1
+				try:
+					async with self.semaphore:
+						async with self.client_session.request(method, api_url, headers=headers, data=data) as response:
+							content = await response.read()
+							status = response.status
+
+				except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+					if not idempotent or attempt >= self.max_retries:
+						raise
+					delay = get_retry_delay(None, attempt, self.backoff_factor)
+					attempt += 1
+					log.warning("Call to %s failed, retry %s in %.1f seconds, %s", api_url, attempt, delay, e)
+					await asyncio.sleep(delay)
+					continue
+
+				if response.status == 401 and refresh_token and not token_refreshed:
+					token_refreshed = True
+					await self.refresh_session_token(used_token)
+					headers["Authorization"] = self.header["Authorization"]
+					continue
+
+				if response.status in RETRY_STATUSES and idempotent and attempt < self.max_retries:
+					delay = get_retry_delay(response, attempt, self.backoff_factor)
+					attempt += 1
+					log.warning("Call to %s returned %s, retry %s in %.1f seconds", api_url, response.status, attempt,
+								delay)
+					await asyncio.sleep(delay)
+					continue
+
+				return response.status, json.loads(content.decode("utf-8-sig")) if content else None
+
+		except Exception as e:
+			error = f"{e.__class__.__name__}: {e}"
+			raise
+
+		finally:
+			self.metrics.record(operation, method, api_url, status, time.monotonic() - started, get_body_size(data),
+								len(content), attempts, error)
+
+	async def refresh_session_token(self, expired_token):
+		"""
+		Gets new session token once for all tasks which got 401 with the same expired token
+		:param expired_token: token which was used in the failed call
+		"""
+		async with self.login_lock:
+			if self.session_token == expired_token:  # otherwise another task has already refreshed it
+				log.info("Archer session token is expired, logging in again")
+				await self.login()
+
+	def get_values_list(self, values_list_id):
+		"""
+		:param values_list_id: internal values list id
+		:return: ValuesList object from values_list_cache, it's not downloaded here, use load_values_lists() first
+		"""
+		values_list = self.values_list_cache.get(values_list_id)
+		if values_list is None:
+			log.error("Values list %s is not loaded, call load_values_lists() first", values_list_id)
+		return values_list
+
+	async def load_values_list(self, values_list_id):
+		"""
+		:param values_list_id: internal values list id
+		:return: ValuesList object, downloaded once and then taken from self.values_list_cache
+		"""
+		values_list = self.values_list_cache.get(values_list_id)
+		if values_list:
+			return values_list
+
+		api_url = self.api_url_base + "core/system/valueslistvalue/flat/valueslist/" + str(values_list_id)
+
+		try:
+			status, data = await self.request("GET", api_url)
+			values_list = ValuesList(data)
+			self.values_list_cache.put(values_list_id, values_list)
+			return values_list
+
+		except Exception as e:
+			log.error("Function load_values_list didn't work, %s", e)
+
+	async def load_values_lists(self, values_list_ids=None):
+		"""
+		:param values_list_ids: internal values list ids, all values lists of the application by default
+		:return: [ValuesList, ...] downloaded concurrently
+		"""
+		if values_list_ids is None:
+			values_list_ids = list(self.vl_name_to_vl_id.values())
+
+		return await asyncio.gather(*(self.load_values_list(values_list_id) for values_list_id in values_list_ids))
+
+	async def from_application(self, app_name=None, preload_values_lists=True):
+		"""
+		:param app_name: sets app you will be working on; type name how it appears in Archer
+		:param preload_values_lists: download all values lists of the application, Record objects need them
+		:return: self, fills AsyncArcherInstance object with proper app_id and fields_ids
+		"""
+		metadata = None
+		if self.metadata_cache:
+			metadata = self.metadata_cache.load(self.get_metadata_cache_key(app_name))
+
+		try:
+			if metadata:
+				self.set_application_metadata(metadata)
+				log.info("Application %s metadata is loaded from cache", app_name)
+			else:
+				await self.get_application_fields(await self.get_application_id(app_name))
+
+				if self.metadata_cache:
+					self.metadata_cache.save(self.get_metadata_cache_key(app_name), self.get_application_metadata())
+
+			if preload_values_lists:
+				await self.load_values_lists()
+
+		except Exception as e:
+			log.error("Function from_application() didn't work, %s", e)
+
+		return self
+
+	async def get_application_id(self, app_name):
+		"""
+		:param app_name: application name how it appears in Archer
+		:return: internal application id
+		"""
+		status, data = await self.request("GET", f"{self.api_url_base}core/system/application/")
+
+		all_folders = []
+		for application in data:
+			if application["RequestedObject"]["Name"] == app_name:
+				return application["RequestedObject"]["Id"]
+			all_folders.append(application["RequestedObject"]["Name"])
+
+		raise RuntimeError(f'Application "{app_name}" is not found, available applications are {all_folders}')
+
+	async def get_application_fields(self, application_id):
+		"""
+		:param application_id: Internal Archer application id
+		:return: Fills the object with all active application fields, subforms are downloaded concurrently,
+				 see ArcherInstance.get_application_fields(), raises RuntimeError if any of them is not loaded
+		"""
+		api_url = f"{self.api_url_base}core/system/fielddefinition/application/" + str(
+				application_id) + "?$filter=IsActive eq true"
+
+		status, data = await self.request("GET", api_url)
+		if status != 200:
+			raise RuntimeError(f"Application {application_id} fields are not loaded, status {status}")
+		subform_ids_by_name = self.parse_application_fields(data)
+
+		subforms = await asyncio.gather(*(self.get_subform_fields_by_id(subform_id)
+										  for subform_id in subform_ids_by_name.values()))
+		for subform_name, (subform_fields_json, all_fields) in zip(subform_ids_by_name, subforms):
+			self.subforms_json_by_sf_name.update({subform_name: subform_fields_json})
+			self.subforms_json_by_sf_name[subform_name].update({"AllFields": all_fields})
+
+	async def get_subform_fields_by_id(self, sub_form_id):
+		"""
+		:param sub_form_id: Gets from parent application field ("RelatedSubformId")
+		:return: see ArcherInstance.parse_subform_fields()
+		"""
+		api_url = f"{self.api_url_base}core/system/fielddefinition/application/" + str(
+				sub_form_id) + "?$filter=IsActive eq true"
+
+		status, data = await self.request("GET", api_url)
+		if status != 200:
+			raise RuntimeError(f"Subform {sub_form_id} fields are not loaded, status {status}")
+		return self.parse_subform_fields(data)
+
+	async def load_users(self, user_ids, load_details=True, load_email=True):
+		"""
+		:param user_ids: iterable of internal Archer user ids
+		:param load_details: load user details (DisplayName, UserName, ...)
+		:param load_email: load user email from contacts
+		:return: list of User objects with loaded details and emails, downloaded concurrently
+		"""
+		users = [self.get_user(user_id) for user_id in user_ids]
+		unique_users = {id(user): user for user in users}.values()
+
+		await asyncio.gather(*(self.load_user(user, load_details, load_email) for user in unique_users))
+		return users
+
+	async def load_user(self, user, load_details=True, load_email=True):
+		"""
+		:param user: User object
+		:param load_details: load user details if they are not loaded yet
+		:param load_email: load user email if it's not loaded yet
+		"""
+		if load_details and not user.is_details_loaded():
+			try:
+				status, data = await self.request("POST", f"{self.api_url_base}core/system/user/{user.user_id}")
+				user.json = data["RequestedObject"]
+			except Exception as e:
+				user.json = {}
+				log.error("Exception %s. Cannot load details for user ID %s", e, user.user_id)
+
+		if load_email and not user.is_email_loaded():
+			try:
+				status, data = await self.request("GET", f"{self.api_url_base}core/system/usercontact/{user.user_id}")
+				user.email = data[0]["RequestedObject"]["Value"] if status == 200 else ""
+			except Exception as e:
+				user.email = ""
+				log.error("Exception %s. Guess there is no email for user ID %s", e, user.user_id)
+
+	async def get_field_contents(self, field_ids, record_ids, chunk_size=100):
+		"""
+		:param field_ids: [field_id1, field_id2, ...]
+		:param record_ids: iterable of internal archer record ids
+		:param chunk_size: number of record ids sent in one request, chunks are requested concurrently
+		:return: list of record jsons in the order of record_ids
+		"""
+		api_url = f"{self.api_url_base}core/content/fieldcontent/"
+		record_ids = [str(record_id) for record_id in record_ids]
+
+		async def get_chunk(cont_ids):
+			body = json.dumps({"FieldIds": field_ids, "ContentIds": cont_ids})
+			try:
+				status, data = await self.request("POST", api_url, data=body, override="POST", idempotent=True)
+			except Exception as e:
+				log.error("Function get_field_contents() didn't work for records %s, %s", cont_ids, e)
+				return []
+
+			records = []
+			for record in data:
+				if record.get("RequestedObject"):
+					records.append(record["RequestedObject"])
+				else:
+					log.error("Record is not returned by Archer, %s", record.get("ValidationMessages"))
+			return records
+
+		chunks = await asyncio.gather(*(get_chunk(record_ids[i:i + chunk_size])
+										for i in range(0, len(record_ids), chunk_size)))
+		return [record for chunk in chunks for record in chunk]
+
+	async def get_record(self, record_id, fields=None):
+		"""
+		:param record_id: internal archer record id
+		:param fields: [field name1, field name2, ...] to get only these fields, all active fields by default
+		:return: record object or None
+		"""
+		records = await self.get_records([record_id], fields=fields)
+		return records[0] if records else None
+
+	async def get_records(self, record_ids, chunk_size=100, fields=None):
+		"""
+		:param record_ids: iterable of internal archer record ids
+		:param chunk_size: number of records requested in one call
+		:param fields: [field name1, field name2, ...] to get only these fields, all active fields by default
+		:return: list of record objects
+		"""
+		record_jsons = await self.get_field_contents(self.get_field_ids_by_names(fields), record_ids, chunk_size)
+		return [Record(self, record_json) for record_json in record_jsons]
+
+	async def get_sub_record(self, sub_record_id, sub_record_name, fields=None):
+		"""
+		:param sub_record_id: internal archer sub record id
+		:param sub_record_name: subform name how you see it in the app
+		:param fields: [subform field name1, ...] to get only these fields, all active subform fields by default
+		:return: record object or None
+		"""
+		field_ids = self.get_field_ids_by_names(fields, sub_record_name)
+		record_jsons = await self.get_field_contents(field_ids, [sub_record_id])
+		return Record(self, record_jsons[0]) if record_jsons else None
+
+	async def get_related_records(self, records, field_name, fields=None, chunk_size=100):
+		"""
+		:param records: iterable of record objects
+		:param field_name: subform, cross-reference or related records field name how you see it in the app
+		:param fields: see ArcherInstance.get_related_records()
+		:param chunk_size: number of records requested in one call, chunks are requested concurrently
+		:return: {record id: [record object, ...]} in the order of references
+		"""
+		references, record_ids = self.get_related_record_ids(records, field_name)
+		record_jsons = await self.get_field_contents(self.get_related_field_ids(field_name, fields), record_ids,
+													 chunk_size)
+		related = {record_json["Id"]: Record(self, record_json) for record_json in record_jsons}
+
+		return {record_id: [related[related_id] for related_id in related_ids if related_id in related]
+				for record_id, related_ids in references.items()}
+
+	async def create_content_record(self, fields_json, record_id=None):
+		"""
+		:param fields_json: see ArcherInstance.create_content_record()
+		:param record_id: internal archer id, if provided the record is updated
+		:returns int - record_id
+		"""
+		api_url = f"{self.api_url_base}core/content/"
+
+		try:
+			await self.load_values_lists([self.get_vl_id_by_field_name(key) for key, value in fields_json.items()
+										  if key in self.vl_name_to_vl_id and has_value_names(value)])
+			body = self.build_content_record_body(fields_json, record_id)
+
+			if record_id:
+				status, data = await self.request("PUT", api_url, data=body, override="PUT")
+				log.info("Record updated, %s", data["RequestedObject"]["Id"])
+			else:
+				status, data = await self.request("POST", api_url, data=body, override="POST")
+				log.info("Function create_content_record created record, %s", data["RequestedObject"]["Id"])
+
+			return data["RequestedObject"]["Id"]
+
+		except Exception as e:
+			log.error("Function create_content_record didn't work, %s", e)
+
+	async def update_content_record(self, updated_json, record_id):
+		"""
+		:param updated_json: see create_content_record()
+		:param record_id: internal archer ID
+		:returns record_id
+		"""
+		return await self.create_content_record(updated_json, record_id)
+
+	async def create_sub_record(self, fields_json, subform_name):
+		"""
+		:param fields_json: see ArcherInstance.create_sub_record()
+		:param subform_name: how you see it in the app
+		:returns sub_record_id
+		"""
+		api_url = f"{self.api_url_base}core/content/"
+
+		try:
+			body = self.build_sub_record_body(fields_json, subform_name)
+			status, data = await self.request("POST", api_url, data=body, override="POST")
+
+			log.info("Function create_sub_record created record, %s", data["RequestedObject"]["Id"])
+			return data["RequestedObject"]["Id"]
+
+		except Exception as e:
+			log.error("Function create_sub_record didn't work, %s", e)
+
+	async def delete_record(self, record_id):
+		"""
+		:param record_id: internal archer ID
+		:return: True if the record is deleted
+		"""
+		api_url = f"{self.api_url_base}core/content/" + str(record_id)
+		body = json.dumps({"Content": {"Id": record_id, "LevelId": self.application_level_id}})
+
+		try:
+			status, data = await self.request("DELETE", api_url, data=body, override="DELETE")
+			log.info("Function delete_content_record deleted record")
+			return status == 200
+
+		except Exception as e:
+			log.error("Function delete_content_record didn't worked, %s", e)
+			return False
+
+	async def post_attachment(self, name, base64_string):
+		"""
+		:param name: Name of the attachment
+		:param base64_string: File in base64_string
+		:return: attachment id
+		"""
+		api_url = f"{self.api_url_base}core/content/attachment"
+		body = json.dumps({"AttachmentName": name, "AttachmentBytes": base64_string})
+
+		try:
+			status, data = await self.request("POST", api_url, data=body, override="POST")
+
+			log.info("Attachment %s posted to Archer", data["RequestedObject"]["Id"])
+			return data["RequestedObject"]["Id"]
+
+		except Exception as e:
+			log.error("Function post_attachment didn't work, %s", e)
+
+# THIS PART IS USING ARCHER GRC API, NOT REST API USED ABOVE
+
+	async def get_grc_endpoint_records(self, endpoint_url, skip=None, select=None, filter=None, orderby=None, top=None):
+		"""
+		:param endpoint_url: see ArcherInstance.get_grc_endpoint_records()
+		:return: array of record jsons
+		"""
+		api_url = self.build_grc_endpoint_url(endpoint_url, skip, select, filter, orderby, top)
+
+		status, data = await self.request("GET", api_url)
+		return data["value"]
+
+	async def get_grc_endpoint_records_count(self, endpoint_url, filter=None):
+		"""
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param filter: OData filter, count only matching records
+		:return: number of records in the endpoint or None if content api doesn't support $count
+		"""
+		api_url = self.build_grc_endpoint_url(endpoint_url + "/$count", filter=filter)
+
+		try:
+			status, data = await self.request("GET", api_url)
+			return int(data) if status == 200 else None
+
+		except Exception as e:
+			log.debug("$count is not supported for %s, %s", endpoint_url, e)
+			return None
+
+	async def get_all_grc_endpoint_records(self, endpoint_url, select=None, filter=None, orderby=None, workers=8):
+		"""
+		Gets all records of the endpoint, pages are downloaded concurrently and merged in order.
+		:param endpoint_url: get from find_grc_endpoint_url()
+		:param select: [field1, field2, ...], only these columns are returned
+		:param filter: OData filter like "Incident_Status eq 'Open'"
+		:param orderby: [field1, "field2 desc", ...]
+		:param workers: number of pages requested at once when $count is not supported
+		:return: array of record jsons
+		"""
+		all_records = await self.get_grc_endpoint_records(endpoint_url, None, select, filter, orderby)
+		if len(all_records) < GRC_PAGE_SIZE:
+			return all_records
+
+		total = await self.get_grc_endpoint_records_count(endpoint_url, filter)
+		skip = GRC_PAGE_SIZE
+
+		while True:
+			if total is not None and skip < total:
+				skips = range(skip, total, GRC_PAGE_SIZE)
+			elif total is not None:  # records were added after $count, check the next page
+				skips = range(skip, skip + GRC_PAGE_SIZE, GRC_PAGE_SIZE)
+			else:
+				skips = range(skip, skip + GRC_PAGE_SIZE * workers, GRC_PAGE_SIZE)
+
+			pages = await asyncio.gather(*(self.get_grc_endpoint_records(endpoint_url, page_skip, select, filter, orderby)
+										   for page_skip in skips))
+			for page in pages:
+				all_records += page
+				if len(page) < GRC_PAGE_SIZE:
+					return all_records
+
+			skip = skips[-1] + GRC_PAGE_SIZE
@@ -0,0 +1,172 @@
+import base64
+import json
+import os
+import re
+
+ATTACHMENT_CHUNK_SIZE = 3 * 256 * 1024  # bytes of the file encoded at once, multiple of 3 so base64 has no padding inside
+ATTACHMENT_BYTES_KEY = re.compile(rb'"AttachmentBytes"\s*:\s*"')
+
+
+def get_file_size(file_object):
+	"""
+	:param file_object: binary file opened for reading
+	:return: number of bytes left from the current position, None if the file is not seekable
+	"""
+	try:
+		position = file_object.tell()
+		size = file_object.seek(0, os.SEEK_END) - position
+		file_object.seek(position)
+		return size
+	except (AttributeError, OSError, ValueError):
+		return None
+
+
+class AttachmentUploadStream:
+	"""
+	File-like body of core/content/attachment call. The file is base64 encoded by chunks while the body is sent,
+	so neither the file nor its base64 string are kept in memory.
+		:param name - attachment name
+		:param file_object - binary file opened for reading
+		:param size - number of bytes to send, taken from the file if it's seekable,
+					  if it's unknown the body has no length and is sent with chunked transfer encoding
+		:param chunk_size - bytes of the file read at once
+	"""
+
+	def __init__(self, name, file_object, size=None, chunk_size=ATTACHMENT_CHUNK_SIZE):
+		self.file_object = file_object
+		self.chunk_size = max(3, chunk_size - chunk_size % 3)
+		self.size = get_file_size(file_object) if size is None else size
+
+		self.prefix = ('{"AttachmentName": ' + json.dumps(name) + ', "AttachmentBytes": "').encode("utf-8")
+		self.suffix = b'"}'
+		self.length = None
+		if self.size is not None:
+			self.length = len(self.prefix) + 4 * ((self.size + 2) // 3) + len(self.suffix)
+
+		self.buffer = self.prefix
+		self.offset = 0
+		self.remainder = b""
+		self.finished = False
+
+	def __len__(self):
+		if self.length is None:
+			raise TypeError("Size of the attachment is unknown")
+		return self.length
+
+	def __iter__(self):
+		return iter(lambda: self.read(self.chunk_size), b"")
+
+	def read(self, size=-1):
+		"""
+		:param size: max number of bytes, all the rest if negative
+		:return: next part of the body, b"" at the end
+		"""
+		if size is None or size < 0:
+			return b"".join(self)
+
+		while self.offset >= len(self.buffer):
+			if self.finished:
+				return b""
+			self.fill_buffer()
+
+		data = self.buffer[self.offset:self.offset + size]
+		self.offset += len(data)
+		return data
+
+	def fill_buffer(self):
+		"""
+		Encodes the next chunk of the file
+		"""
+		data = self.file_object.read(self.chunk_size)
+		if data:
+			data = self.remainder + data
+			cut = len(data) - len(data) % 3  # only full 3 byte groups, so no padding is added in the middle
+			self.remainder = data[cut:]
+			self.buffer = base64.b64encode(data[:cut])
+		else:
+			self.buffer = base64.b64encode(self.remainder) + self.suffix
+			self.remainder = b""
+			self.finished = True
+		self.offset = 0
+
+
+def write_attachment_content(chunks, file_object):
+	"""
+	Decodes AttachmentBytes of core/content/attachment/{id} response while it's downloaded
+	:param chunks: iterable of bytes of the response body
+	:param file_object: binary file opened for writing, decoded content is written there
+	:return: response json without the content, AttachmentBytes is ""
+	"""
+	text = b""  # response without the content, it's small
+	searched = 0
+	in_content = False
+	carry = b""
+
+	for chunk in chunks:
+		while chunk:
+			if not in_content:
+				text += chunk
+				chunk = b""
+				match = ATTACHMENT_BYTES_KEY.search(text, searched)
+				if not match:
+					searched = max(searched, len(text) - 32)  # the key could be split between chunks
+					continue
+				chunk = text[match.end():]
+				text = text[:match.end()]
+				in_content = True
+
+			end = chunk.find(b'"')
+			content = chunk if end < 0 else chunk[:end]
+			data = carry + content.replace(b"\\", b"")  # "/" could be escaped as "\/"
+			cut = len(data) - len(data) % 4
+			carry = data[cut:]
+			file_object.write(base64.b64decode(data[:cut]))
+
+			if end < 0:
+				chunk = b""
+			else:
+				if carry:
+					raise ValueError("AttachmentBytes is not valid base64")
+				chunk = chunk[end:]
+				in_content = False
+				searched = len(text)  # content is over, the key is not searched there again
+
+	if in_content:
+		raise ValueError("Attachment content is not complete")
+
+	return json.loads(text.decode("utf-8-sig"))
+
+
+class AttachmentDescriptor:
+	"""
+	Attachment referenced by an attachment or image field of a record, see Record.get_field_content()
+		:param archer_instance - archer instance object the record was read with
+		:param attachment_id - internal attachment id
+		:param record_id - id of the record with the field
+		:param field_id - attachment field id
+	"""
+
+	__slots__ = ("archer_instance", "attachment_id", "record_id", "field_id")
+
+	def __init__(self, archer_instance, attachment_id, record_id=None, field_id=None):
+		self.archer_instance = archer_instance
+		self.attachment_id = attachment_id
+		self.record_id = record_id
+		self.field_id = field_id
+
+	def __eq__(self, other):
+		return isinstance(other, AttachmentDescriptor) and self.attachment_id == other.attachment_id
+
+	def __hash__(self):
+		return hash(self.attachment_id)
+
+	def __repr__(self):
+		return f"AttachmentDescriptor(attachment_id={self.attachment_id}, record_id={self.record_id}, " \
+			   f"field_id={self.field_id})"
+
+	def download(self, file, chunk_size=1024 * 1024):
+		"""
+		:param file: path or binary file opened for writing, see ArcherInstance.download_attachment()
+		:return: attachment name
+		"""
+		return self.archer_instance.download_attachment(self.attachment_id, file, chunk_size)
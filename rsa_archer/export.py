@@ -0,0 +1,193 @@
+import csv
+import json
+import os
+
+try:
+	import orjson
+except ImportError:  # optional dependency for faster serialization, pip install rsa_archer[fast]
+	orjson = None
+
+try:
+	import pyarrow
+	import pyarrow.parquet
+except ImportError:  # optional dependency for parquet export, pip install rsa_archer[parquet]
+	pyarrow = None
+
+EXPORT_FORMATS = {".ndjson": "ndjson", ".jsonl": "ndjson", ".json": "ndjson", ".csv": "csv", ".parquet": "parquet"}
+
+
+def get_export_format(path, format=None):
+	"""
+	:param path: output file
+	:param format: "ndjson", "csv" or "parquet", taken from the file extension if it's not provided
+	:return: format name
+	"""
+	if format is None:
+		format = EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+		if format is None:
+			raise ValueError(f"Cannot guess export format of {path}, use format= {sorted(set(EXPORT_FORMATS.values()))}")
+	if format not in EXPORT_FORMATS.values():
+		raise ValueError(f"Unknown export format {format}, use one of {sorted(set(EXPORT_FORMATS.values()))}")
+	return format
+
+
+def format_cell(value):
+	"""
+	:param value: decoded field value
+	:return: value for a flat file, lists are joined with "; ", dicts are json, None is ""
+	"""
+	if value is None:
+		return ""
+	if isinstance(value, list):
+		return "; ".join(format_cell(item) for item in value)
+	if isinstance(value, dict):
+		return json.dumps(value, default=str)
+	return str(value)
+
+
+class NdjsonExportWriter:
+	"""
+	Writes one json object per line, values keep their types (lists, numbers)
+	"""
+
+	def __init__(self, path, columns):
+		self.file = open(path, "wb")
+		self.columns = columns
+		if orjson:
+			self.dumps = lambda row: orjson.dumps(row, default=str)
+		else:
+			self.dumps = lambda row: json.dumps(row, default=str, ensure_ascii=False).encode("utf-8")
+
+	def write_rows(self, rows):
+		self.file.write(b"".join(self.dumps(row) + b"\n" for row in rows))
+
+	def close(self):
+		self.file.close()
+
+
+class CsvExportWriter:
+	"""
+	Writes header with column names and one line per row, values are formatted by format_cell()
+	"""
+
+	def __init__(self, path, columns):
+		self.file = open(path, "w", newline="", encoding="utf-8")
+		self.columns = columns
+		self.writer = csv.writer(self.file)
+		self.writer.writerow(columns)
+
+	def write_rows(self, rows):
+		self.writer.writerows([[format_cell(row.get(column)) for column in self.columns] for row in rows])
+
+	def close(self):
+		self.file.close()
+
+
+class ParquetExportWriter:
+	"""
+	Writes one row group per write_rows() call, all columns are strings formatted by format_cell(), so the schema
+	doesn't depend on the first rows
+	"""
+
+	def __init__(self, path, columns):
+		if pyarrow is None:
+			raise ImportError("Parquet export needs pyarrow, install it with: pip install rsa_archer[parquet]")
+		self.columns = columns
+		self.schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+		self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+	def write_rows(self, rows):
+		if rows:
+			table = pyarrow.table({column: [format_cell(row.get(column)) for row in rows] for column in self.columns},
+								  schema=self.schema)
+			self.writer.write_table(table)
+
+	def close(self):
+		self.writer.close()
+
+
+def open_export_writer(path, columns, format=None):
+	"""
+	:param path: output file
+	:param columns: column names, NDJSON writes every key of rows
+	:param format: see get_export_format()
+	:return: writer with write_rows(rows) and close()
+	"""
+	writers = {"ndjson": NdjsonExportWriter, "csv": CsvExportWriter, "parquet": ParquetExportWriter}
+	return writers[get_export_format(path, format)](path, columns)
+
+
+class RecordRowDecoder:
+	"""
+	Turns record jsons of the selected application into flat rows {column: value}.
+	Field ids, types and values lists are resolved once, users are loaded once per batch of rows and cached.
+		:param archer_instance - archer instance object with selected application, see from_application()
+		:param fields - [field name how you see it in the app, ...], all fields by default
+		:param resolve_users - user fields are exported as display names, otherwise as user ids
+	"""
+
+	def __init__(self, archer_instance, fields=None, resolve_users=True):
+		self.archer_instance = archer_instance
+		self.resolve_users = resolve_users
+
+		if fields is None:
+			fields = [name for name in archer_instance.application_fields_json if isinstance(name, str)]
+		self.columns = ["Id"] + list(fields)
+
+		self.fields = []
+		for name in fields:
+			field_id = archer_instance.get_field_id_by_name(name)
+			field_type = archer_instance.application_fields_json[field_id]["Type"]
+			values_list = None
+			if field_type == 4:
+				values_list = archer_instance.get_values_list(archer_instance.get_vl_id_by_field_name(name))
+			self.fields.append((name, str(field_id), field_type, values_list))
+
+		self.field_ids = [int(field_id) for name, field_id, field_type, values_list in self.fields]
+
+	def get_user_ids(self, record_jsons):
+		user_ids = set()
+		for record_json in record_jsons:
+			for name, field_id, field_type, values_list in self.fields:
+				content = record_json["FieldContents"].get(field_id)
+				if field_type == 8 and content and content.get("Value"):
+					user_ids.update(str(user["Id"]) for user in content["Value"].get("UserList") or [])
+		return user_ids
+
+	def decode(self, record_jsons):
+		"""
+		:param record_jsons: list of record jsons, see ArcherInstance.get_field_contents()
+		:return: list of rows
+		"""
+		if self.resolve_users:
+			user_ids = [user_id for user_id in self.get_user_ids(record_jsons)
+						if not self.archer_instance.get_user(user_id).is_details_loaded()]
+			if user_ids:
+				self.archer_instance.load_users(user_ids, load_email=False)
+
+		return [self.decode_record(record_json) for record_json in record_jsons]
+
+	def decode_record(self, record_json):
+		row = {"Id": record_json["Id"]}
+		field_contents = record_json["FieldContents"]
+
+		for name, field_id, field_type, values_list in self.fields:
+			content = field_contents.get(field_id)
+			value = content.get("Value") if content else None
+
+			if value is None:
+				row[name] = None
+			elif field_type == 4:
+				row[name] = [values_list.get_path(value_id) if values_list else value_id
+							 for value_id in value.get("ValuesListIds") or []]
+			elif field_type == 8:
+				user_ids = [user["Id"] for user in value.get("UserList") or []]
+				if self.resolve_users:
+					row[name] = [self.archer_instance.get_user(user_id).json.get("DisplayName", user_id)
+								 for user_id in user_ids]
+				else:
+					row[name] = user_ids
+			else:
+				row[name] = value
+
+		return row
@@ -0,0 +1,193 @@
+import logging
+import re
+import sqlite3
+import threading
+from collections.abc import Mapping, MutableMapping
+from itertools import islice
+
+from .state_file import load_state_file, save_state_file
+
+log = logging.getLogger(__name__)
+
+MAPPING_STATE_VERSION = 1  # increase when the format of the state file is changed, old files are ignored
+ISO_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})?$")
+
+
+def format_odata_literal(value):
+	"""
+	:param value: number, ISO date string returned by GRC content api or text
+	:return: value for OData $filter, dates without time zone are taken as UTC
+	"""
+	if isinstance(value, bool):
+		return "true" if value else "false"
+	if isinstance(value, (int, float)):
+		return str(value)
+	if ISO_DATETIME.match(value):
+		return value if value.endswith("Z") or re.search(r"[+-]\d{2}:\d{2}$", value) else value + "Z"
+	return "'" + value.replace("'", "''") + "'"
+
+
+def load_mapping_state(path):
+	"""
+	:param path: state file saved by save_mapping_state()
+	:return: {"settings": {...}, "high_water_mark": value, "mapping": {key: record id}} or None
+	"""
+	return load_state_file(path, MAPPING_STATE_VERSION, f"key mapping state {path}")
+
+
+def save_mapping_state(path, settings, high_water_mark, mapping):
+	"""
+	:param path: state file, saved atomically so other processes never read half written file
+	:param settings: parameters of the sync, state is used only by the sync with the same settings
+	:param high_water_mark: the latest last updated date or the max record id seen
+	:param mapping: {key field value: record id}
+	"""
+	save_state_file(path, {"settings": settings, "high_water_mark": high_water_mark, "mapping": mapping},
+					MAPPING_STATE_VERSION, f"key mapping state {path}")
+
+
+class DictKeyIndex(dict):
+	"""
+	Default in-memory key field value to record id index, it's a dict with batched methods of SQLiteKeyIndex
+	"""
+
+	def get_many(self, keys):
+		"""
+		:param keys: iterable of key field values
+		:return: {key: record id} for found keys
+		"""
+		return {key: self[key] for key in keys if key in self}
+
+	def set_many(self, items):
+		"""
+		:param items: iterable of (key, record id) or dict
+		"""
+		self.update(items)
+
+	def delete_many(self, keys):
+		"""
+		:param keys: iterable of key field values, missing keys are ignored
+		"""
+		for key in keys:
+			self.pop(key, None)
+
+	def close(self):
+		pass
+
+
+class SQLiteKeyIndex(MutableMapping):
+	"""
+	Key field value to record id index in SQLite file, it's opened instantly, memory doesn't grow with number of keys
+	and the file could be shared by many processes (WAL mode, pages are memory mapped). Works like a dict.
+		:param path - database file, created if it doesn't exist
+		:param table - table name, one file could keep indexes of several applications
+		:param mmap_size - bytes of the file memory mapped by every connection
+	"""
+
+	def __init__(self, path, table="key_index", mmap_size=256 * 1024 * 1024):
+		if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", table):
+			raise ValueError(f"Invalid table name {table}")
+
+		self.path = path
+		self.table = table
+		self.mmap_size = mmap_size
+		self.local = threading.local()  # sqlite connection per thread
+		self.connections = []
+		self.lock = threading.Lock()
+
+		with self.get_connection() as connection:
+			connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, record_id INTEGER NOT NULL) "
+							   f"WITHOUT ROWID")
+
+	def get_connection(self):
+		connection = getattr(self.local, "connection", None)
+		if connection is None:
+			connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+			connection.execute("PRAGMA journal_mode=WAL")
+			connection.execute("PRAGMA synchronous=NORMAL")
+			connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+			self.local.connection = connection
+			with self.lock:
+				self.connections.append(connection)
+		return connection
+
+	def __getitem__(self, key):
+		row = self.get_connection().execute(f"SELECT record_id FROM {self.table} WHERE key = ?", (key,)).fetchone()
+		if row is None:
+			raise KeyError(key)
+		return row[0]
+
+	def __setitem__(self, key, record_id):
+		with self.get_connection() as connection:
+			connection.execute(f"INSERT OR REPLACE INTO {self.table} (key, record_id) VALUES (?, ?)", (key, record_id))
+
+	def __delitem__(self, key):
+		with self.get_connection() as connection:
+			cursor = connection.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+		if cursor.rowcount == 0:
+			raise KeyError(key)
+
+	def __iter__(self):
+		for (key,) in self.get_connection().execute(f"SELECT key FROM {self.table}"):
+			yield key
+
+	def __len__(self):
+		return self.get_connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+	def __contains__(self, key):
+		return self.get_connection().execute(f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)).fetchone() is not None
+
+	def items(self):
+		return self.get_connection().execute(f"SELECT key, record_id FROM {self.table}").fetchall()
+
+	def get_many(self, keys, chunk_size=500):
+		"""
+		:param keys: iterable of key field values
+		:param chunk_size: keys looked up in one query
+		:return: {key: record id} for found keys
+		"""
+		connection = self.get_connection()
+		found = {}
+		keys = iter(keys)
+		while True:
+			chunk = list(islice(keys, chunk_size))
+			if not chunk:
+				return found
+			placeholders = ",".join("?" * len(chunk))
+			found.update(connection.execute(f"SELECT key, record_id FROM {self.table} WHERE key IN ({placeholders})",
+											chunk))
+
+	def set_many(self, items):
+		"""
+		:param items: iterable of (key, record id) or dict, saved in one transaction
+		"""
+		if isinstance(items, Mapping):
+			items = items.items()
+		with self.get_connection() as connection:
+			connection.executemany(f"INSERT OR REPLACE INTO {self.table} (key, record_id) VALUES (?, ?)", items)
+
+	def delete_many(self, keys):
+		"""
+		:param keys: iterable of key field values, missing keys are ignored
+		"""
+		with self.get_connection() as connection:
+			connection.executemany(f"DELETE FROM {self.table} WHERE key = ?", ((key,) for key in keys))
+
+	def update(self, other=(), **kwargs):
+		self.set_many(other)
+		if kwargs:
+			self.set_many(kwargs)
+
+	def clear(self):
+		with self.get_connection() as connection:
+			connection.execute(f"DELETE FROM {self.table}")
+
+	def close(self):
+		"""
+		Closes connections of all threads
+		"""
+		with self.lock:
+			for connection in self.connections:
+				connection.close()
+			self.connections = []
+		self.local = threading.local()
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import time
+
+from .state_file import load_state_file, save_state_file
+
+log = logging.getLogger(__name__)
+
+METADATA_CACHE_VERSION = 2  # increase when the format of cached metadata is changed, old files are ignored
+
+
+def encode_metadata(value):
+	"""
+	Archer metadata dicts mix name keys with integer field id keys, json would turn them all into strings,
+	so dicts are stored as lists of [key, value] pairs
+	"""
+	if isinstance(value, dict):
+		return {"__pairs__": [[key, encode_metadata(item)] for key, item in value.items()]}
+	if isinstance(value, list):
+		return [encode_metadata(item) for item in value]
+	return value
+
+
+def decode_metadata(value):
+	if isinstance(value, dict) and "__pairs__" in value:
+		return {key: decode_metadata(item) for key, item in value["__pairs__"]}
+	if isinstance(value, list):
+		return [decode_metadata(item) for item in value]
+	return value
+
+
+class MetadataCache:
+	"""
+	On-disk cache of application metadata (fields, subforms, values list ids, level id), one json file per application
+		:param cache_dir - folder for cache files, ~/.cache/rsa_archer by default
+		:param ttl - seconds after which metadata is downloaded again, None keeps it until invalidate()
+	"""
+
+	def __init__(self, cache_dir=None, ttl=86400):
+		if not cache_dir:
+			cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "rsa_archer")
+		self.cache_dir = cache_dir
+		self.ttl = ttl
+
+	def get_path(self, key):
+		"""
+		:param key: any string, e.g. instance url + instance name + application name
+		:return: path of the cache file
+		"""
+		file_name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json"
+		return os.path.join(self.cache_dir, file_name)
+
+	def load(self, key):
+		"""
+		:param key: see get_path()
+		:return: metadata dict or None if it's not cached, expired or saved by another version
+		"""
+		cached = load_state_file(self.get_path(key), METADATA_CACHE_VERSION, f"metadata cache for {key}")
+		if cached is None or cached.get("key") != key:
+			return None
+		if self.ttl is not None and time.time() - cached["saved_at"] > self.ttl:
+			return None
+
+		return decode_metadata(cached["metadata"])
+
+	def save(self, key, metadata):
+		"""
+		:param key: see get_path()
+		:param metadata: dict, saved atomically so other processes never read half written file
+		"""
+		save_state_file(self.get_path(key), {"key": key, "metadata": encode_metadata(metadata)}, METADATA_CACHE_VERSION,
+						f"metadata cache for {key}")
+
+	def invalidate(self, key=None):
+		"""
+		:param key: drop metadata of one application, or all cached files if not provided
+		"""
+		if key is not None:
+			paths = [self.get_path(key)]
+		elif os.path.isdir(self.cache_dir):
+			paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+		else:
+			paths = []
+
+		for path in paths:
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
@@ -0,0 +1,118 @@
+import logging
+import math
+import threading
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+def get_body_size(body):
+	"""
+	:param body: request or response body, bytes, str or None
+	:return: size in bytes, 0 for streamed bodies (files, generators) which size is unknown
+	"""
+	if body is None:
+		return 0
+	if isinstance(body, str):
+		return len(body.encode("utf-8"))
+	if isinstance(body, (bytes, bytearray)):
+		return len(body)
+	try:
+		return len(body)  # e.g. AttachmentUploadStream
+	except TypeError:
+		return 0
+
+
+def get_percentile(sorted_values, percentile):
+	"""
+	:param sorted_values: list of numbers sorted ascending
+	:param percentile: from 0 to 100
+	:return: nearest-rank percentile, None for empty list
+	"""
+	if not sorted_values:
+		return None
+	index = max(0, math.ceil(percentile / 100 * len(sorted_values)) - 1)
+	return sorted_values[index]
+
+
+class RequestMetrics:
+	"""
+	Collects number of calls, errors, bytes sent/received and latency of Archer calls per logical operation
+	(get_record, create_content_record, get_values_list, get_user_contact, grc_page, ...), safe to share between threads
+		:param callback - function called after every call with a dict, e.g. to export it to your metrics system:
+			{"operation", "method", "url", "status", "duration", "bytes_sent", "bytes_received", "attempts", "error"}
+		:param max_samples - number of the latest latencies kept per operation to calculate percentiles
+	"""
+
+	def __init__(self, callback=None, max_samples=10000):
+		self.callback = callback
+		self.max_samples = max_samples
+		self.operations = {}
+		self.lock = threading.Lock()
+
+	def record(self, operation, method, url, status, duration, bytes_sent=0, bytes_received=0, attempts=1, error=None):
+		"""
+		Adds one call, retries of the call are counted in attempts, duration includes them
+		:param operation: logical operation name
+		:param status: http status code, None if there was no response
+		:param duration: seconds
+		:param error: exception text if the call failed without response
+		"""
+		with self.lock:
+			stats = self.operations.get(operation)
+			if stats is None:
+				stats = {"calls": 0, "errors": 0, "attempts": 0, "bytes_sent": 0, "bytes_received": 0,
+						 "total_seconds": 0.0, "latencies": deque(maxlen=self.max_samples)}
+				self.operations[operation] = stats
+
+			stats["calls"] += 1
+			stats["attempts"] += attempts
+			stats["bytes_sent"] += bytes_sent
+			stats["bytes_received"] += bytes_received
+			stats["total_seconds"] += duration
+			stats["latencies"].append(duration)
+			if error or status is None or status >= 400:
+				stats["errors"] += 1
+
+		if self.callback:
+			try:
+				self.callback({"operation": operation, "method": method, "url": url, "status": status,
+							   "duration": duration, "bytes_sent": bytes_sent, "bytes_received": bytes_received,
+							   "attempts": attempts, "error": error})
+			except Exception as e:
+				log.error("Metrics callback failed, %s", e)
+
+	def get_summary(self, percentiles=(50, 90, 99)):
+		"""
+		:param percentiles: latency percentiles to calculate
+		:return: {operation: {"calls", "errors", "attempts", "bytes_sent", "bytes_received", "total_seconds",
+							  "p50", "p90", "p99", "max"}}, latencies are in seconds
+		"""
+		summary = {}
+		with self.lock:
+			for operation, stats in self.operations.items():
+				latencies = sorted(stats["latencies"])
+				operation_summary = {key: value for key, value in stats.items() if key != "latencies"}
+				for percentile in percentiles:
+					operation_summary[f"p{percentile}"] = get_percentile(latencies, percentile)
+				operation_summary["max"] = latencies[-1] if latencies else None
+				summary[operation] = operation_summary
+
+		return summary
+
+	def log_summary(self):
+		"""
+		Logs one line per operation, e.g. at the end of a job
+		"""
+		for operation, stats in sorted(self.get_summary().items()):
+			log.info("%s: %s calls, %s errors, %s attempts, sent %s bytes, received %s bytes, "
+					 "p50 %.3fs, p90 %.3fs, p99 %.3fs, max %.3fs", operation, stats["calls"], stats["errors"],
+					 stats["attempts"], stats["bytes_sent"], stats["bytes_received"], stats["p50"], stats["p90"],
+					 stats["p99"], stats["max"])
+
+	def reset(self):
+		"""
+		Forgets collected calls, e.g. between runs
+		"""
+		with self.lock:
+			self.operations = {}
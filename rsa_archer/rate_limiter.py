@@ -0,0 +1,87 @@
+import threading
+import time
+from contextlib import contextmanager
+
+ENDPOINT_CLASSES = ("content_write", "fieldcontent_read", "content_api", "user", "other")
+
+
+class RateLimiter:
+	"""
+	Token bucket rate limiter, safe to share between threads
+		:param rate - calls per second
+		:param burst - max number of calls made at once after idle time, rate by default
+	"""
+
+	def __init__(self, rate, burst=None):
+		self.rate = float(rate)
+		self.burst = float(burst or max(rate, 1))
+		self.tokens = self.burst
+		self.updated_at = time.monotonic()
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		"""
+		Blocks until the call is allowed
+		"""
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+				self.updated_at = now
+
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+
+			time.sleep(wait)
+
+
+class RequestGovernor:
+	"""
+	Limits calls to Archer: rate (token bucket) and number of calls in flight, for all calls and optionally
+	per endpoint class. One governor could be shared by several ArcherInstance objects to cap the load of the whole job.
+		:param rate - calls per second for all calls, None means no limit
+		:param max_in_flight - max number of calls at the same time, None means no limit
+		:param endpoint_limits - {endpoint class: {"rate": calls per second, "max_in_flight": calls}}, endpoint classes:
+				"content_write" - create, update, delete records and attachments
+				"fieldcontent_read" - get_record(s), get_sub_record(s)
+				"content_api" - GRC content api
+				"user" - users, user contacts, roles and groups of users
+				"other" - login, application metadata, values lists
+	"""
+
+	def __init__(self, rate=None, max_in_flight=None, endpoint_limits=None):
+		self.rate_limiter = RateLimiter(rate) if rate else None
+		self.semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+
+		self.endpoint_rate_limiters = {}
+		self.endpoint_semaphores = {}
+		for endpoint_class, limits in (endpoint_limits or {}).items():
+			if endpoint_class not in ENDPOINT_CLASSES:
+				raise ValueError(f"Unknown endpoint class {endpoint_class}, use one of {ENDPOINT_CLASSES}")
+			if limits.get("rate"):
+				self.endpoint_rate_limiters[endpoint_class] = RateLimiter(limits["rate"])
+			if limits.get("max_in_flight"):
+				self.endpoint_semaphores[endpoint_class] = threading.BoundedSemaphore(limits["max_in_flight"])
+
+	@contextmanager
+	def limit(self, endpoint_class="other"):
+		"""
+		Blocks until the call of endpoint_class is allowed, use it as "with governor.limit(endpoint_class):"
+		"""
+		# semaphores are always taken in the same order (endpoint class, then all calls), so threads can't deadlock
+		semaphores = [semaphore for semaphore in (self.endpoint_semaphores.get(endpoint_class), self.semaphore)
+					  if semaphore]
+		for semaphore in semaphores:
+			semaphore.acquire()
+
+		try:
+			for rate_limiter in (self.endpoint_rate_limiters.get(endpoint_class), self.rate_limiter):
+				if rate_limiter:
+					rate_limiter.acquire()
+			yield
+
+		finally:
+			for semaphore in reversed(semaphores):
+				semaphore.release()
@@ -1,25 +1,179 @@
+import inspect
 import logging
-import json
-import requests
+import re
+import threading
+from bisect import bisect_left
+from datetime import datetime
+from decimal import Decimal
 
-from .user import User
+from .attachment import AttachmentDescriptor
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 log = logging.getLogger(__name__)
 
 
+ARCHER_DATETIME = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(?::\d{2})?)(\.\d+)?(Z|[+-]\d{2}:\d{2})?$")
+
+
+def parse_archer_datetime(value):
+	"""
+	:param value: "2020-01-15T13:45:00", fractions of seconds (up to 7 digits) and time zone are optional
+	:return: datetime, with tzinfo only if the value has time zone
+	"""
+	match = ARCHER_DATETIME.match(value)
+	if not match:
+		raise ValueError(f"Unknown date format {value}")
+	fraction = match.group(2)[:7].ljust(7, "0") if match.group(2) else ""  # python takes 3 or 6 digits
+	time_zone = match.group(3) or ""
+	return datetime.fromisoformat(match.group(1) + fraction + ("+00:00" if time_zone == "Z" else time_zone))
+
+
+def decode_numeric(record, position, value):
+	return Decimal(str(value))
+
+
+def decode_date(record, position, value):
+	return parse_archer_datetime(value)
+
+
+def decode_values_list(record, position, value):
+	"""
+	:return: ["Parent Value:Value", ...] of {'ValuesListIds': [69809], 'OtherText': None}
+	"""
+	list_of_value_ids = value["ValuesListIds"]
+	if not list_of_value_ids:
+		raise ValueError("no values are selected")
+	values_list_id = record.schema.values_list_ids[position]
+	if values_list_id is None:  # values list of the field is unknown, e.g. application metadata is not loaded
+		return None
+	return [record.get_value_from_valueslistid(value_id, values_list_id) for value_id in list_of_value_ids]
+
+
+def decode_users(record, position, value):
+	"""
+	:return: [User, ...] of {'UserList': [{'Id': 11077, 'HasRead': True, ...}], 'GroupList': []}
+	"""
+	return [record.archer_instance.get_user(user["Id"]) for user in value["UserList"]]
+
+
+def decode_references(record, position, value):
+	"""
+	:return: [record id, ...] of cross-reference [{'ContentId': 212724, 'LevelId': 34}, ...] or subform [id, ...]
+	"""
+	return [item["ContentId"] if isinstance(item, dict) else item for item in value]
+
+
+def decode_attachments(record, position, value):
+	"""
+	:return: [AttachmentDescriptor, ...] of [attachment id, ...]
+	"""
+	return [AttachmentDescriptor(record.archer_instance, item["Id"] if isinstance(item, dict) else item, record.id,
+								 record.schema.field_ids[position]) for item in value]
+
+
+# field type: function(record, position, raw value) returning python value, types not listed are returned as they are
+FIELD_DECODERS = {
+	2: decode_numeric,  # Numeric
+	3: decode_date,  # Date
+	4: decode_values_list,  # Values List
+	8: decode_users,  # User/Groups List
+	9: decode_references,  # Cross-Reference
+	11: decode_attachments,  # Attachment
+	12: decode_attachments,  # Image
+	21: decode_date,  # First Published
+	22: decode_date,  # Last Updated
+	23: decode_references,  # Related Records
+	24: decode_references,  # Sub-Form
+}
+
+
+class RecordSchema:
+	"""
+	Field names, ids and types of one application or subform level. One schema is shared by all records of the level,
+	so a record keeps only positions and values of its fields, see ArcherInstance.get_record_schema()
+		:param fields - [(field id, field type, field name, values list id), ...], see ArcherInstance.get_schema_fields()
+	"""
+
+	def __init__(self, fields=None):
+		self.positions = {}  # {"field id": position of the field in the schema}
+		self.positions_by_name = {}
+		self.field_ids = []
+		self.field_names = []
+		self.field_types = []
+		self.values_list_ids = []
+		self.lock = threading.Lock()
+
+		for field_id, field_type, name, values_list_id in fields or []:
+			self.add_field(field_id, field_type, name, values_list_id)
+
+	def __len__(self):
+		return len(self.field_ids)
+
+	def add_field(self, field_id, field_type, name=None, values_list_id=None):
+		"""
+		Adds a field, records could have fields which are not in application metadata, they are available by id only
+		:return: position of the field value
+		"""
+		with self.lock:
+			position = self.positions.get(str(field_id))
+			if position is None:
+				position = len(self.field_ids)
+				self.field_ids.append(int(field_id))
+				self.field_names.append(name)
+				self.field_types.append(field_type)
+				self.values_list_ids.append(values_list_id)
+				self.positions[str(field_id)] = position
+				if name is not None:
+					self.positions_by_name[name] = position
+			return position
+
+
 class Record:
 	"""
+	Record keeps positions of its fields in the shared RecordSchema and their values in two tuples, only fields
+	present in the response are kept, values are decoded on the first access
 		:param archer_instance - archer incstance object
 		:param json:
 					{'Id': 305943, 'LevelId': 67, 'SequentialId': 2, 'FieldContents':
 					{'18974': {'Type': 9, 'Value': [{'ContentId': 212724, 'LevelId': 34}], 'FieldId': 18974}}
+		:param schema - RecordSchema of the record level, taken from archer_instance by LevelId if not provided
 	"""
 
-	def __init__(self, archer_instance, json):
+	__slots__ = ("archer_instance", "schema", "id", "level_id", "record_sequential_id", "positions", "values",
+				 "decoded")
+
+	def __init__(self, archer_instance, json, schema=None):
 		self.archer_instance = archer_instance
-		self.json = json
-		self.record_sequential_id = json["SequentialId"]  # just a sequesntial number of record created in application, in my case it was used for uniquly identify a record
+		self.id = json.get("Id")
+		self.level_id = json.get("LevelId")
+		self.record_sequential_id = json.get("SequentialId")  # just a sequesntial number of record created in application, in my case it was used for uniquly identify a record
+		self.schema = schema or archer_instance.get_record_schema(self.level_id)
+
+		positions = self.schema.positions
+		fields = []
+		for field_id, content in json["FieldContents"].items():
+			position = positions.get(field_id)
+			if position is None:
+				position = self.schema.add_field(field_id, content.get("Type"))
+			fields.append((position, content.get("Value")))
+		fields.sort(key=lambda field: field[0])  # sorted by position, see get_raw_value()
+
+		self.positions = tuple(position for position, value in fields)
+		self.values = tuple(value for position, value in fields)
+		self.decoded = None  # {position: decoded value}, created on the first access
+
+	@property
+	def json(self):
+		"""
+		:return: record json in the format of Archer response, it's built from the values
+		"""
+		field_contents = {}
+		for position, value in zip(self.positions, self.values):
+			field_id = self.schema.field_ids[position]
+			field_contents[str(field_id)] = {"Type": self.schema.field_types[position], "Value": value,
+											 "FieldId": field_id}
+		return {"Id": self.id, "LevelId": self.level_id, "SequentialId": self.record_sequential_id,
+				"FieldContents": field_contents}
 
 	def get_field_content(self, field_name):
 		"""
@@ -27,63 +181,92 @@ class Record:
 		:returns    value of the field
 					array of Users for user field
 					LIST of values for values list, including parent value in leveled values list. Looks like this [Parent Value:Value]
-					TODO other types of fields
+					datetime for dates, Decimal for numbers
+					list of record ids for cross-reference, related records and subform fields
+					list of AttachmentDescriptor for attachment and image fields
+					raw value for other types of fields, see FIELD_DECODERS
 		"""
+		position = self.schema.positions_by_name.get(field_name)
+		if position is None:
+			log.info(f"The field {field_name} is not in the record, return None")
+			return None
 
-		field_id = self.archer_instance.get_field_id_by_name(field_name)
-		field_type = self.json["FieldContents"][str(field_id)]["Type"]
+		return self.get_value(position)
 
-		try:
-			if field_type == 4:  # Values List return ValuesListIds, which should be returned {'ValuesListIds': [69809], 'OtherText': None}
-				values_list_id = self.archer_instance.get_vl_id_by_field_name(field_name)
-				list_of_value_ids = self.json["FieldContents"][str(field_id)]["Value"]["ValuesListIds"]
-
-				if len(list_of_value_ids) > 1:
-					multiple_values = []
-					for one_id in list_of_value_ids:
-						returned_value = self.get_value_from_valueslistid(one_id, values_list_id)
-						multiple_values.append(returned_value)
-
-					return multiple_values
-				else:
-					value_id = self.json["FieldContents"][str(field_id)]["Value"]["ValuesListIds"][0]
-					return [self.get_value_from_valueslistid(value_id, values_list_id)]
-
-			if field_type == 8:  # User/group list {'UserList': [{'Id': 11077, 'HasRead': True, 'HasUpdate': True, 'HasDelete': False}], 'GroupList': []}
-				user_ids = self.json["FieldContents"][str(field_id)]["Value"]["UserList"]
-				users = []
-				for user in user_ids:
-					users.append(User(self.archer_instance, user_id=user["Id"]))
-
-				return users
-			else:
-				return self.json["FieldContents"][str(field_id)]["Value"]
+	def get_value(self, position):
+		"""
+		:param position: position of the field in the schema
+		:return: decoded value, it's decoded once and kept in the record
+		"""
+		if self.decoded is not None and position in self.decoded:
+			return self.decoded[position]
 
+		value = self.get_raw_value(position)
+		try:
+			value = self.decode_value(position, value)
 		except Exception as e:
-			log.info(f"The field {field_name} is empty, return None. Exception %s", e)
+			log.info(f"The field {self.schema.field_names[position]} is empty, return None. Exception %s", e)
+			value = None
+
+		if self.decoded is None:
+			self.decoded = {}
+		self.decoded[position] = value
+		return value
+
+	def get_raw_value(self, position):
+		"""
+		:param position: position of the field in the schema
+		:return: value from Archer response, None if the field is not in the record
+		"""
+		index = bisect_left(self.positions, position)
+		if index < len(self.positions) and self.positions[index] == position:
+			return self.values[index]
+		return None
+
+	def decode_value(self, position, value):
+		"""
+		:param position: position of the field in the schema
+		:param value: raw value from Archer response
+		:return: decoded value, see FIELD_DECODERS, values of other field types are returned as they are
+		"""
+		decoder = FIELD_DECODERS.get(self.schema.field_types[position])
+		if decoder is None or value is None:
+			return value
+		return decoder(self, position, value)
+
+	def get_field_content_by_id(self, field_id):
+		"""
+		:param field_id: internal field id, e.g. for records of applications which metadata is not loaded
+		:return: value of the field, see get_field_content()
+		"""
+		position = self.schema.positions.get(str(field_id))
+		if position is None:
+			log.info(f"The field {field_id} is not in the record, return None")
 			return None
 
+		return self.get_value(position)
+
+	def to_dict(self, fields=None):
+		"""
+		:param fields: [field name1, field name2, ...], all fields of the record by default
+		:return: {field name: value}, values are decoded like in get_field_content()
+		"""
+		positions_by_name = self.schema.positions_by_name
+		if fields is None:
+			return {name: self.get_value(position) for name, position in positions_by_name.items()}
+
+		return {name: self.get_value(positions_by_name[name]) if name in positions_by_name else None for name in fields}
 
 	def get_value_from_valueslistid(self, value_id, values_list_id):
 		"""
 
 		:param value_id: internal values id
 		:param values_list_id: internal field id
-		:return:
+		:return: "Parent Value:Value", values list is downloaded once per archer_instance, see ArcherInstance.get_values_list()
 		"""
-		api_url = self.archer_instance.api_url_base + "core/system/valueslistvalue/flat/valueslist/" + str(values_list_id)
-
 		try:
-			response = requests.get(api_url, headers=self.archer_instance.header, verify=False)
-			data = json.loads(response.content.decode("utf-8"))
-
-			for value in data:
-				if value["RequestedObject"]["Id"] == value_id:
-					if value["RequestedObject"]["ParentId"]:
-						parent_value_in_multi_layer_setup = self.get_value_from_valueslistid(value["RequestedObject"]["ParentId"], values_list_id)
-						return parent_value_in_multi_layer_setup + ":" + value["RequestedObject"]["Name"]
-					else:
-						return value["RequestedObject"]["Name"]
+			values_list = self.archer_instance.get_values_list(values_list_id)
+			return values_list.get_path(value_id)
 
 		except Exception as e:
 			log.error("Function get_value_from_valueslistid didn't work, %s", e)
@@ -93,3 +276,47 @@ class Record:
 		:return: I forgot why I added this
 		"""
 		return self.record_sequential_id
+
+
+def decode_records(records, fields=None, load_users=False):
+	"""
+	Decodes many records at once, field positions are resolved once per schema, values lists are downloaded once
+	and users of all records are loaded in one batch
+	:param records: iterable of Record objects
+	:param fields: [field name1, field name2, ...], all fields of every record by default
+	:param load_users: load details of users of user fields (DisplayName, UserName, ...) with ArcherInstance.load_users(),
+					   for AsyncArcherInstance await its load_users() before
+	:return: list of {field name: value} like Record.to_dict()
+	"""
+	records = list(records)
+	positions_by_schema = {}
+	for record in records:
+		if id(record.schema) not in positions_by_schema:
+			names = record.schema.positions_by_name
+			positions_by_schema[id(record.schema)] = [(name, names.get(name)) for name in fields] \
+				if fields is not None else list(names.items())
+
+	values_list_ids = set()
+	user_ids = set()
+	for record in records:
+		schema = record.schema
+		for name, position in positions_by_schema[id(schema)]:
+			value = record.get_raw_value(position) if position is not None else None
+			if value is None:
+				continue
+			if schema.field_types[position] == 4 and schema.values_list_ids[position] is not None:
+				values_list_ids.add((record.archer_instance, schema.values_list_ids[position]))
+			elif schema.field_types[position] == 8 and load_users:
+				user_ids.update(user["Id"] for user in value.get("UserList") or [])
+
+	for archer_instance, values_list_id in values_list_ids:
+		archer_instance.get_values_list(values_list_id)
+	if user_ids:
+		archer_instance = records[0].archer_instance
+		if inspect.iscoroutinefunction(archer_instance.load_users):
+			raise TypeError("load_users=True works with ArcherInstance only, "
+							"call await archer_instance.load_users() before decode_records()")
+		archer_instance.load_users(user_ids, load_email=False)
+
+	return [{name: record.get_value(position) if position is not None else None
+			 for name, position in positions_by_schema[id(record.schema)]} for record in records]
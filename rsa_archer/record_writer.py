@@ -0,0 +1,69 @@
+import json
+
+try:
+	import orjson
+except ImportError:  # optional dependency for faster serialization, pip install rsa_archer[fast]
+	orjson = None
+
+from .values_list_cache import has_value_names
+
+
+class RecordWriter:
+	"""
+	Prepared writer of create_content_record() payloads. Field ids, types and values lists are resolved once,
+	then each record is serialized straight from its values without copying field templates.
+		:param archer_instance - archer instance object with selected application, see from_application()
+		:param field_names - [field name how you see it in the app, ...]
+		:param json_backend - "orjson" or "json", orjson is used by default when it's installed
+	"""
+
+	def __init__(self, archer_instance, field_names, json_backend=None):
+		if json_backend is None:
+			json_backend = "orjson" if orjson else "json"
+		if json_backend == "orjson" and orjson is None:
+			raise ImportError("orjson is not installed, install it with: pip install rsa_archer[fast]")
+
+		self.archer_instance = archer_instance
+		self.field_names = list(field_names)
+		self.dumps = json.dumps if json_backend == "json" else lambda value: orjson.dumps(value).decode("utf-8")
+		self.level_id = json.dumps(archer_instance.application_level_id)
+
+		self.field_prefixes = {}
+		self.values_list_ids = {}
+		for field_name in self.field_names:
+			field_id = archer_instance.get_field_id_by_name(field_name)
+			template = archer_instance.application_fields_json[field_id]
+			self.field_prefixes[field_name] = '"%s": {"Type": %s, "FieldId": %s, "Value": ' % (
+				field_id, json.dumps(template["Type"]), json.dumps(template["FieldId"]))
+
+			if field_name in archer_instance.vl_name_to_vl_id:
+				self.values_list_ids[field_name] = archer_instance.vl_name_to_vl_id[field_name]
+
+	def build_body(self, values, record_id=None):
+		"""
+		:param values: {field name: value content} or [value content, ...] in the order of field_names,
+					   see create_content_record()
+		:param record_id: internal archer id if the record is updated
+		:return: json string for core/content/, same as ArcherInstance.build_content_record_body()
+		"""
+		items = values.items() if isinstance(values, dict) else zip(self.field_names, values)
+
+		field_contents = []
+		for field_name, value in items:
+			if field_name in self.values_list_ids and has_value_names(value):
+				values_list = self.archer_instance.get_values_list(self.values_list_ids[field_name])
+				value = values_list.resolve_value_names(value, field_name)
+			field_contents.append(self.field_prefixes[field_name] + self.dumps(value) + "}")
+
+		if record_id:
+			return '{"Content": {"Id": %s, "LevelId": %s, "FieldContents": {%s}}}' % (
+				self.dumps(record_id), self.level_id, ", ".join(field_contents))
+		return '{"Content": {"LevelId": %s, "FieldContents": {%s}}}' % (self.level_id, ", ".join(field_contents))
+
+	def save(self, values, record_id=None):
+		"""
+		:param values: see build_body()
+		:param record_id: internal archer id, if provided the record is updated
+		:returns int - record_id, raises RuntimeError if the record is not saved
+		"""
+		return self.archer_instance.send_content_record(self.build_body(values, record_id), record_id)
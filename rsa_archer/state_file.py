@@ -0,0 +1,48 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+log = logging.getLogger(__name__)
+
+
+def load_state_file(path, version, description):
+	"""
+	:param path: json file saved by save_state_file()
+	:param version: expected format version, files saved with another version are ignored
+	:param description: what the file is, used in log messages
+	:return: state dict with "version" and "saved_at" or None if the file is missing, broken or of another version
+	"""
+	try:
+		with open(path, encoding="utf-8") as f:
+			state = json.load(f)
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		log.error("Cannot read %s, %s", description, e)
+		return None
+
+	if not isinstance(state, dict) or state.get("version") != version:
+		return None
+	return state
+
+
+def save_state_file(path, state, version, description):
+	"""
+	:param path: json file, saved atomically so other processes never read half written file
+	:param state: json serializable dict, "version" and "saved_at" are added to it
+	:param version: format version checked by load_state_file()
+	:param description: what the file is, used in log messages
+	"""
+	state = dict(state, version=version, saved_at=time.time())
+
+	try:
+		directory = os.path.dirname(os.path.abspath(path))
+		os.makedirs(directory, exist_ok=True)
+		fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+		with os.fdopen(fd, "w", encoding="utf-8") as f:
+			json.dump(state, f)
+		os.replace(tmp_path, path)
+	except Exception as e:
+		log.error("Cannot save %s, %s", description, e)
@@ -0,0 +1,138 @@
+"""
+Offline benchmarks of ArcherInstance against MockArcherServer, no Archer instance is needed:
+	python -m rsa_archer.tests.benchmark --records 5000 --latency 0.02 --workers 8
+	python -m rsa_archer.tests.benchmark --json > before.json
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rsa_archer.metadata_cache import MetadataCache
+from rsa_archer.tests.mock_archer import FIRST_RECORD_ID, MockArcherServer
+
+
+def measure(name, function, items=1):
+	"""
+	:param name: benchmark name
+	:param function: function without arguments, it's called once
+	:param items: number of processed items (records, calls) to calculate throughput
+	:return: {"name": name, "seconds": duration, "items": items, "items_per_second": throughput, "result": returned value}
+	"""
+	started = time.perf_counter()
+	result = function()
+	seconds = time.perf_counter() - started
+	return {"name": name, "seconds": seconds, "items": items, "items_per_second": items / seconds if seconds else None,
+			"result": result}
+
+
+def run_benchmarks(records=2000, fields=20, subforms=5, values_list_size=200, users=100, latency=0.01, workers=8,
+				   chunk_size=100, writes=500):
+	"""
+	Starts MockArcherServer with the given dataset and measures:
+		from_application - cold (with values lists preloaded) and from metadata cache
+		get_records - reading all records and decoding Title and Severity
+		create_content_record - writes from a thread pool, bulk_upsert - the same records updated by key
+		build_unique_value_to_id_mapping - GRC content api paging of all records
+	:param latency: seconds added by the server to every response
+	:param workers: threads used for writes and GRC pages
+	:param chunk_size: records read in one fieldcontent call
+	:param writes: number of records created and then updated
+	:return: list of results, see measure()
+	"""
+	results = []
+	with MockArcherServer(records=records, fields=fields, subforms=subforms, values_list_size=values_list_size,
+						  users=users, latency=latency) as server:
+		archer_instance = server.create_archer_instance(pool_maxsize=max(workers, 10))
+		application = server.application
+
+		results.append(measure("from_application", lambda: archer_instance.from_application(
+			application, workers=workers, preload_values_lists=True)))
+
+		with tempfile.TemporaryDirectory() as cache_dir:
+			cached_instance = server.create_archer_instance(metadata_cache=MetadataCache(cache_dir))
+			cached_instance.from_application(application)
+			results.append(measure("from_application (metadata cache)",
+								   lambda: cached_instance.from_application(application)))
+			cached_instance.close()
+
+		record_ids = list(range(FIRST_RECORD_ID, FIRST_RECORD_ID + records))
+
+		def read_records():
+			count = 0
+			for record in archer_instance.get_records(record_ids, chunk_size=chunk_size):
+				record.get_field_content("Title")
+				record.get_field_content("Severity")
+				count += 1
+			return count
+
+		results.append(measure("get_records", read_records, records))
+
+		payloads = [{"Key": f"new-{i}", "Title": f"New record {i}", "Severity": ["Value 1"], "Text 0": "text"}
+					for i in range(writes)]
+
+		def create_records():
+			with ThreadPoolExecutor(max_workers=workers) as executor:
+				return list(executor.map(archer_instance.create_content_record, payloads))
+
+		results.append(measure("create_content_record", create_records, writes))
+
+		def build_mapping():
+			archer_instance.key_field_value_to_system_id.clear()
+			archer_instance.build_unique_value_to_id_mapping(application, "Key", workers=workers)
+			return len(archer_instance.key_field_value_to_system_id)
+
+		results.append(measure("build_unique_value_to_id_mapping", build_mapping, records + writes))
+
+		results.append(measure("bulk_upsert", lambda: archer_instance.bulk_upsert(payloads, key_field="Key",
+																					workers=workers), writes))
+
+		results.append({"name": "server requests", "seconds": None, "items": server.request_count,
+						"items_per_second": None, "result": None})
+		archer_instance.close()
+
+	return results
+
+
+def format_results(results):
+	"""
+	:param results: from run_benchmarks()
+	:return: table as a string
+	"""
+	lines = [f"{'benchmark':<36}{'seconds':>10}{'items':>10}{'items/s':>12}"]
+	for result in results:
+		seconds = f"{result['seconds']:.3f}" if result["seconds"] is not None else "-"
+		per_second = f"{result['items_per_second']:.1f}" if result["items_per_second"] else "-"
+		lines.append(f"{result['name']:<36}{seconds:>10}{result['items']:>10}{per_second:>12}")
+	return "\n".join(lines)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Offline benchmarks of rsa_archer against a local mock Archer server")
+	parser.add_argument("--records", type=int, default=2000)
+	parser.add_argument("--fields", type=int, default=20)
+	parser.add_argument("--subforms", type=int, default=5)
+	parser.add_argument("--values-list-size", type=int, default=200)
+	parser.add_argument("--users", type=int, default=100)
+	parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every response")
+	parser.add_argument("--workers", type=int, default=8)
+	parser.add_argument("--chunk-size", type=int, default=100)
+	parser.add_argument("--writes", type=int, default=500)
+	parser.add_argument("--json", action="store_true", help="print results as json")
+	args = parser.parse_args()
+
+	logging.getLogger().setLevel(logging.WARNING)
+	results = run_benchmarks(args.records, args.fields, args.subforms, args.values_list_size, args.users, args.latency,
+							 args.workers, args.chunk_size, args.writes)
+
+	if args.json:
+		print(json.dumps([{key: value for key, value in result.items() if key != "result"} for result in results],
+						 indent=2))
+	else:
+		print(format_results(results))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,461 @@
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from rsa_archer.archer_instance import ArcherInstance
+from rsa_archer.async_archer_instance import AsyncArcherInstance
+
+APPLICATION_ID = 100
+LEVEL_ID = 101
+VALUES_LIST_ID = 500
+KEY_FIELD_ID = 1001
+TITLE_FIELD_ID = 1002
+SEVERITY_FIELD_ID = 1003
+OWNER_FIELD_ID = 1004
+LAST_UPDATED_FIELD_ID = 1005
+FIRST_RECORD_ID = 100001
+
+FILTER_OPERATORS = {"eq": lambda a, b: a == b, "ne": lambda a, b: a != b, "gt": lambda a, b: a > b,
+					"ge": lambda a, b: a >= b, "lt": lambda a, b: a < b, "le": lambda a, b: a <= b}
+
+
+def parse_odata_value(value):
+	"""
+	:param value: 'text', number, date, true, false or null from OData $filter
+	:return: python value
+	"""
+	if value.startswith("'") and value.endswith("'"):
+		return value[1:-1].replace("''", "'")
+	if value in ("true", "false"):
+		return value == "true"
+	if value == "null":
+		return None
+	if re.match(r"^\d{4}-\d{2}-\d{2}T", value):  # dates are stored in UTC without time zone
+		date = datetime.fromisoformat(value[:-1] + "+00:00" if value.endswith("Z") else value)
+		if date.tzinfo:
+			date = date.astimezone(timezone.utc).replace(tzinfo=None)
+		return date.isoformat()
+	try:
+		return int(value)
+	except ValueError:
+		return float(value)
+
+
+def parse_odata_filter(filter):
+	"""
+	:param filter: "Field1 eq 'a' and Field2 gt 10", only "and" of simple comparisons is supported
+	:return: function taking GRC record and returning True if it matches the filter
+	"""
+	conditions = []
+	for condition in re.split(r"\s+and\s+", filter.strip()):
+		match = re.match(r"^(\w+)\s+(eq|ne|gt|ge|lt|le)\s+(.+)$", condition.strip())
+		if not match:
+			raise ValueError(f"Unsupported $filter condition {condition}")
+		conditions.append((match.group(1), match.group(2), parse_odata_value(match.group(3).strip())))
+
+	def matches(record):
+		for field, operator, value in conditions:
+			record_value = record.get(field)
+			if (record_value is None or value is None) and operator not in ("eq", "ne"):
+				return False
+			if not FILTER_OPERATORS[operator](record_value, value):
+				return False
+		return True
+
+	return matches
+
+
+class MockArcherServer:
+	"""
+	Local stand-in for Archer REST api and GRC content api, used by offline benchmarks and tests. It implements login,
+	application and field definitions, values lists, content (create, update, delete), fieldcontent, attachments,
+	users, user contacts, groups and contentapi with $skip, $top, $select, $filter, $orderby and $count.
+		:param records - number of content records in the application
+		:param fields - number of additional text fields, besides Key, Title, Severity, Owner, Last Updated and subforms
+		:param subforms - number of subform fields, every subform has text field "Text" and values list field "Severity"
+		:param values_list_size - number of values in the Severity values list
+		:param users - number of users
+		:param latency - seconds added to every response
+		:param application - application name, it's also the GRC endpoint name
+
+	Use it as "with MockArcherServer(records=1000) as server:" and create_archer_instance() to connect to it.
+	"""
+
+	def __init__(self, records=1000, fields=20, subforms=5, values_list_size=100, users=50, latency=0.0,
+				 application="Incidents", instance_name="mock"):
+		self.record_count = records
+		self.field_count = fields
+		self.subform_count = subforms
+		self.values_list_size = values_list_size
+		self.user_count = users
+		self.latency = latency
+		self.application = application
+		self.instance_name = instance_name
+
+		self.lock = threading.Lock()
+		self.tokens = set()
+		self.next_token = 0
+		self.request_count = 0
+		self.records = {}
+		self.deleted_ids = set()
+		self.record_ids = list(range(FIRST_RECORD_ID, FIRST_RECORD_ID + records))
+		self.next_record_id = FIRST_RECORD_ID + records
+		self.attachments = {}
+		self.next_attachment_id = 1
+		self.started_at = datetime(2020, 1, 1)
+		self.requested_field_ids = []  # FieldIds of every fieldcontent call
+		self.count_supported = True  # content api of some Archer versions returns 404 for $count
+		# field definitions of these applications and subforms return 500, tests add ids here
+		self.failing_application_ids = set()
+
+		self.fields = [
+			{"Id": KEY_FIELD_ID, "Name": "Key", "Type": 1},
+			{"Id": TITLE_FIELD_ID, "Name": "Title", "Type": 1},
+			{"Id": SEVERITY_FIELD_ID, "Name": "Severity", "Type": 4, "RelatedValuesListId": VALUES_LIST_ID},
+			{"Id": OWNER_FIELD_ID, "Name": "Owner", "Type": 8},
+			{"Id": LAST_UPDATED_FIELD_ID, "Name": "Last Updated", "Type": 3},
+		]
+		self.fields += [{"Id": 1100 + i, "Name": f"Text {i}", "Type": 1} for i in range(fields)]
+		self.fields += [{"Id": 1500 + i, "Name": f"Subform {i}", "Type": 24, "RelatedSubformId": 200 + i}
+						for i in range(subforms)]
+		for field in self.fields:
+			field["LevelId"] = LEVEL_ID
+
+		# ten top level values, the rest are their children
+		self.values = [{"Id": 5000 + i, "Name": f"Value {i}", "ParentId": None if i < 10 else 5000 + i % 10}
+					   for i in range(values_list_size)]
+
+		self.server = None
+		self.thread = None
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, exc_type, exc, tb):
+		self.stop()
+
+	def start(self, port=0):
+		"""
+		:param port: 0 picks a free port
+		:return: self, server is running in a background thread
+		"""
+		self.server = ThreadingHTTPServer(("127.0.0.1", port), MockArcherRequestHandler)
+		self.server.daemon_threads = True
+		self.server.archer = self
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		if self.server:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+
+	@property
+	def inst_url(self):
+		return f"127.0.0.1:{self.server.server_address[1]}"
+
+	def create_archer_instance(self, **kwargs):
+		"""
+		:param kwargs: passed to ArcherInstance
+		:return: ArcherInstance logged in to this server
+		"""
+		return ArcherInstance(self.inst_url, self.instance_name, "api", "password", scheme="http", **kwargs)
+
+	def create_async_archer_instance(self, **kwargs):
+		"""
+		:param kwargs: passed to AsyncArcherInstance
+		:return: AsyncArcherInstance, use it as "async with server.create_async_archer_instance() as archer_instance:"
+		"""
+		return AsyncArcherInstance(self.inst_url, self.instance_name, "api", "password", scheme="http", **kwargs)
+
+	def expire_tokens(self):
+		"""
+		All session tokens become invalid, next calls get 401
+		"""
+		with self.lock:
+			self.tokens.clear()
+
+	def get_record(self, record_id):
+		"""
+		:param record_id: internal record id
+		:return: record json like in fieldcontent response or None
+		"""
+		with self.lock:
+			if record_id in self.records:
+				return self.records[record_id]
+			if record_id in self.deleted_ids:
+				return None
+		if not FIRST_RECORD_ID <= record_id < FIRST_RECORD_ID + self.record_count:
+			return None
+		return self.generate_record(record_id)
+
+	def generate_record(self, record_id):
+		"""
+		:param record_id: id of one of the initial records
+		:return: record json, the same every time for the same id
+		"""
+		number = record_id - FIRST_RECORD_ID
+		field_contents = {
+			str(KEY_FIELD_ID): {"Type": 1, "Value": str(number + 1), "FieldId": KEY_FIELD_ID},
+			str(TITLE_FIELD_ID): {"Type": 1, "Value": f"Record {number + 1}", "FieldId": TITLE_FIELD_ID},
+			str(SEVERITY_FIELD_ID): {"Type": 4, "FieldId": SEVERITY_FIELD_ID, "Value": {
+				"ValuesListIds": [self.values[number % len(self.values)]["Id"]] if self.values else [],
+				"OtherText": None}},
+			str(OWNER_FIELD_ID): {"Type": 8, "FieldId": OWNER_FIELD_ID, "Value": {
+				"UserList": [{"Id": number % self.user_count + 1}] if self.user_count else [], "GroupList": []}},
+			str(LAST_UPDATED_FIELD_ID): {"Type": 3, "FieldId": LAST_UPDATED_FIELD_ID,
+										 "Value": (self.started_at + timedelta(minutes=number)).isoformat()},
+		}
+		for i in range(self.field_count):
+			field_contents[str(1100 + i)] = {"Type": 1, "Value": f"Text {i} of record {number + 1}", "FieldId": 1100 + i}
+		for i in range(self.subform_count):
+			field_contents[str(1500 + i)] = {"Type": 24, "Value": [], "FieldId": 1500 + i}
+
+		return {"Id": record_id, "LevelId": LEVEL_ID, "SequentialId": number + 1, "FieldContents": field_contents}
+
+	def get_grc_record(self, record):
+		"""
+		:param record: record json
+		:return: row of GRC content api, field names with underscores instead of spaces
+		"""
+		grc_record = {f"{self.application}_Id": record["Id"]}
+		for field in self.fields:
+			content = record["FieldContents"].get(str(field["Id"]))
+			if content is None or field["Type"] in (4, 8, 24):
+				continue
+			grc_record[field["Name"].replace(" ", "_")] = content["Value"]
+		return grc_record
+
+	def get_filtered_grc_records(self, query, skip=0, top=None):
+		"""
+		:param query: {"$filter": [...], "$orderby": [...]} parsed query string
+		:return: list of GRC records after $filter and $orderby, from skip to skip + top
+		"""
+		with self.lock:
+			record_ids = list(self.record_ids)
+
+		if "$filter" not in query and "$orderby" not in query:  # only the page is built
+			record_ids = record_ids[skip:None if top is None else skip + top]
+			skip, top = 0, None
+		records = (self.get_grc_record(self.get_record(record_id)) for record_id in record_ids)
+
+		if "$filter" in query:
+			matches = parse_odata_filter(query["$filter"][0])
+			records = (record for record in records if matches(record))
+		records = list(records)
+
+		if "$orderby" in query:
+			for order in reversed(query["$orderby"][0].split(",")):
+				field, _, direction = order.strip().partition(" ")
+				records.sort(key=lambda record: (record.get(field) is None, record.get(field)),
+							 reverse=direction.strip() == "desc")
+
+		return records[skip:None if top is None else skip + top]
+
+	def get_grc_records(self, query):
+		"""
+		:param query: {"$skip": [...], "$top": [...], ...} parsed query string
+		:return: list of GRC records after $filter, $orderby, $skip, $top and $select
+		"""
+		skip = int(query.get("$skip", ["0"])[0])
+		top = min(int(query.get("$top", ["1000"])[0]), 1000)
+		records = self.get_filtered_grc_records(query, skip, top)
+
+		if "$select" in query:
+			select = query["$select"][0].split(",")
+			records = [{field: record.get(field) for field in select} for record in records]
+		return records
+
+	def save_record(self, body):
+		"""
+		:param body: core/content request body
+		:return: saved record id
+		"""
+		content = body["Content"]
+		field_contents = {str(field_id): dict(value, FieldId=int(field_id))
+						  for field_id, value in content.get("FieldContents", {}).items()}
+
+		record_id = content.get("Id")
+		record = self.get_record(int(record_id)) if record_id else None
+		if record_id and record is None:
+			return None
+
+		with self.lock:
+			if record_id:
+				record_id = int(record_id)
+				record = self.records.setdefault(record_id, record)
+				record["FieldContents"].update(field_contents)
+			else:
+				record_id = self.next_record_id
+				self.next_record_id += 1
+				self.records[record_id] = {"Id": record_id, "LevelId": int(content["LevelId"]),
+										   "SequentialId": record_id - FIRST_RECORD_ID + 1,
+										   "FieldContents": field_contents}
+				if int(content["LevelId"]) == LEVEL_ID:
+					self.record_ids.append(record_id)
+
+			self.records[record_id]["FieldContents"][str(LAST_UPDATED_FIELD_ID)] = {
+				"Type": 3, "FieldId": LAST_UPDATED_FIELD_ID, "Value": datetime.now().replace(microsecond=0).isoformat()}
+		return record_id
+
+	def delete_record(self, record_id):
+		with self.lock:
+			self.records.pop(record_id, None)
+			self.deleted_ids.add(record_id)
+			if record_id in self.record_ids:
+				self.record_ids.remove(record_id)
+
+	def handle(self, method, path, query, headers, body):
+		"""
+		:return: (status code, response json)
+		"""
+		override = headers.get("X-Http-Method-Override") or method
+		with self.lock:
+			self.request_count += 1
+		if self.latency:
+			time.sleep(self.latency)
+
+		if path.endswith("/api/core/security/login"):
+			with self.lock:
+				self.next_token += 1
+				token = f"mock-token-{self.next_token}"
+				self.tokens.add(token)
+			return 200, {"RequestedObject": {"SessionToken": token}, "IsSuccessful": True}
+
+		token = (headers.get("Authorization") or "").replace("Archer session-id=", "")
+		with self.lock:
+			if token not in self.tokens:
+				return 401, {"IsSuccessful": False, "ValidationMessages": ["Session is expired"]}
+
+		if "/contentapi/" in path or path.endswith("/contentapi"):
+			endpoint = path.split("/contentapi", 1)[1].strip("/")
+			if not endpoint:
+				return 200, {"value": [{"name": self.application, "url": self.application}]}
+			if endpoint == f"{self.application}/$count" and self.count_supported:
+				return 200, len(self.get_filtered_grc_records(query))
+			if endpoint == self.application:
+				return 200, {"value": self.get_grc_records(query)}
+			return 404, {"message": "No HTTP resource was found"}
+
+		api_path = path.split("/api/", 1)[1]
+		if api_path == "core/system/application/":
+			return 200, [{"RequestedObject": {"Id": APPLICATION_ID, "Name": self.application}, "IsSuccessful": True}]
+
+		match = re.match(r"core/system/fielddefinition/application/(\d+)$", api_path)
+		if match:
+			application_id = int(match.group(1))
+			if application_id in self.failing_application_ids:
+				return 500, {"message": "Field definitions are not available"}
+			if application_id == APPLICATION_ID:
+				return 200, [{"RequestedObject": field, "IsSuccessful": True} for field in self.fields]
+			if 200 <= application_id < 200 + self.subform_count:
+				return 200, [{"RequestedObject": {"Id": 2000 + application_id, "Name": "Text", "Type": 1,
+												  "LevelId": 100 + application_id}, "IsSuccessful": True},
+							 {"RequestedObject": {"Id": 3000 + application_id, "Name": "Severity", "Type": 4,
+												  "RelatedValuesListId": VALUES_LIST_ID, "LevelId": 100 + application_id},
+							  "IsSuccessful": True}]
+			return 404, []
+
+		if api_path == f"core/system/valueslistvalue/flat/valueslist/{VALUES_LIST_ID}":
+			return 200, [{"RequestedObject": value, "IsSuccessful": True} for value in self.values]
+
+		if api_path == "core/content/fieldcontent/":
+			field_ids = {str(field_id) for field_id in body.get("FieldIds") or []}
+			with self.lock:
+				self.requested_field_ids.append(body.get("FieldIds"))
+			response = []
+			for content_id in body["ContentIds"]:
+				record = self.get_record(int(content_id))
+				if record is None:
+					response.append({"RequestedObject": None, "IsSuccessful": False,
+									 "ValidationMessages": [f"Content {content_id} is not found"]})
+					continue
+				field_contents = {field_id: value for field_id, value in record["FieldContents"].items()
+								  if not field_ids or field_id in field_ids}
+				response.append({"RequestedObject": dict(record, FieldContents=field_contents), "IsSuccessful": True})
+			return 200, response
+
+		if api_path == "core/content/attachment" and override == "POST":
+			with self.lock:
+				attachment_id = self.next_attachment_id
+				self.next_attachment_id += 1
+				self.attachments[attachment_id] = body
+			return 200, {"RequestedObject": {"Id": attachment_id}, "IsSuccessful": True}
+
+		match = re.match(r"core/content/attachment/(\d+)$", api_path)
+		if match:
+			attachment = self.attachments.get(int(match.group(1)))
+			if attachment is None:
+				return 404, {"RequestedObject": None, "IsSuccessful": False}
+			return 200, {"RequestedObject": attachment, "IsSuccessful": True}
+
+		if api_path == "core/content/" and override in ("POST", "PUT"):
+			record_id = self.save_record(body)
+			if record_id is None:
+				return 200, {"RequestedObject": None, "IsSuccessful": False, "ValidationMessages": ["Record is not found"]}
+			return 200, {"RequestedObject": {"Id": record_id}, "IsSuccessful": True}
+
+		match = re.match(r"core/content/(\d+)$", api_path)
+		if match and override == "DELETE":
+			self.delete_record(int(match.group(1)))
+			return 200, {"RequestedObject": None, "IsSuccessful": True}
+
+		if api_path == "core/system/user/":
+			return 200, [{"RequestedObject": self.get_user(user_id), "IsSuccessful": True}
+						 for user_id in range(1, self.user_count + 1)]
+
+		match = re.match(r"core/system/user/(\d+)$", api_path)
+		if match and 1 <= int(match.group(1)) <= self.user_count:
+			return 200, {"RequestedObject": self.get_user(int(match.group(1))), "IsSuccessful": True}
+
+		match = re.match(r"core/system/usercontact/(\d+)$", api_path)
+		if match and 1 <= int(match.group(1)) <= self.user_count:
+			return 200, [{"RequestedObject": {"Value": f"user{match.group(1)}@example.com", "ContactType": 1},
+						  "IsSuccessful": True}]
+
+		if api_path.startswith(("core/system/user/status/", "core/system/userrole", "core/system/usergroup")):
+			return 200, {"RequestedObject": None, "IsSuccessful": True}
+
+		if api_path == "core/system/group/":
+			return 200, [{"RequestedObject": {"Id": 1, "Name": "Everyone"}, "IsSuccessful": True}]
+
+		return 404, {"message": f"No HTTP resource was found for {api_path}"}
+
+	def get_user(self, user_id):
+		return {"Id": user_id, "UserName": f"user{user_id}", "DisplayName": f"User {user_id}", "AccountStatus": 1,
+				"LastLoginDate": None}
+
+
+class MockArcherRequestHandler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"  # keep-alive, like IIS in front of Archer
+	disable_nagle_algorithm = True  # headers and body are written separately, don't wait for delayed ack
+
+	def log_message(self, format, *args):
+		pass
+
+	def handle_request(self):
+		url = urlsplit(self.path)
+		length = int(self.headers.get("Content-Length") or 0)
+		content = self.rfile.read(length) if length else b""
+
+		try:
+			body = json.loads(content) if content else None
+			status, data = self.server.archer.handle(self.command, unquote(url.path), parse_qs(url.query),
+													 self.headers, body)
+		except Exception as e:
+			status, data = 500, {"message": f"{e.__class__.__name__}: {e}"}
+
+		response = json.dumps(data).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json; charset=utf-8")
+		self.send_header("Content-Length", str(len(response)))
+		self.end_headers()
+		self.wfile.write(response)
+
+	do_GET = do_POST = do_PUT = do_DELETE = handle_request
@@ -10,6 +10,13 @@ class TestArcherInstance:
 
 		assert len(self.archer_instance.session_token) > 0
 
+	def test_connection_reuse(self):
+		self.archer_instance = ArcherInstance(ARCHER_DOMAIN, INSTANCE_NAME, USERNAME, PASSWORD)
+		self.archer_instance.from_application(APPLICATION)
+		stats = self.archer_instance.get_connection_stats()
+
+		assert stats["requests"] > 1 and stats["reused"] > 0
+
 	def test_from_application(self):
 		self.archer_instance = ArcherInstance(ARCHER_DOMAIN, INSTANCE_NAME, USERNAME, PASSWORD)
 		self.archer_instance.from_application(APPLICATION)
@@ -21,6 +28,15 @@ class TestArcherInstance:
 #		self.archer_instance.update_content_record(updater_json, record_id)
 		pass
 
+	def test_get_records(self):
+		self.archer_instance = ArcherInstance(ARCHER_DOMAIN, INSTANCE_NAME, USERNAME, PASSWORD)
+		self.archer_instance.from_application(APPLICATION)
+		jsons = self.archer_instance.get_grc_endpoint_records(APPLICATION)
+		record_ids = [record[APPLICATION + "_Id"] for record in jsons[:5]]
+		records = list(self.archer_instance.get_records(record_ids, chunk_size=2))
+
+		assert len(records) == len(record_ids)
+
 	def test_post_attachment(self):
 		self.archer_instance = ArcherInstance(ARCHER_DOMAIN, INSTANCE_NAME, USERNAME, PASSWORD)
 		id = self.archer_instance.post_attachment("TEST.TXT", """RXJyb3IsIHBsZWFzZSByZXNlbmQgZmlsZSBpbiB6aXAgZm9ybWF0LiBUaGlzIHR5cGVzIG9mIGZp
@@ -0,0 +1,11 @@
+from rsa_archer.tests.benchmark import run_benchmarks
+
+
+class TestBenchmark:
+	def test_benchmarks(self):
+		results = {result["name"]: result for result in run_benchmarks(records=300, latency=0, writes=20)}
+
+		assert results["get_records"]["result"] == 300
+		assert all(results["create_content_record"]["result"])
+		assert results["build_unique_value_to_id_mapping"]["result"] == 320
+		assert [result["status"] for result in results["bulk_upsert"]["result"]] == ["updated"] * 20
@@ -0,0 +1,537 @@
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+import requests
+
+from rsa_archer.key_mapping import SQLiteKeyIndex, format_odata_literal
+from rsa_archer.metadata_cache import MetadataCache
+from rsa_archer.metrics import RequestMetrics, get_percentile
+from rsa_archer.rate_limiter import RateLimiter, RequestGovernor
+from rsa_archer.state_file import load_state_file, save_state_file
+from rsa_archer.record import decode_records, parse_archer_datetime
+from rsa_archer.tests.mock_archer import FIRST_RECORD_ID, MockArcherServer
+
+
+@pytest.fixture
+def server(request):
+	"""
+	MockArcherServer with 50 records, 5 users and 1 subform, other sizes are set with
+	@pytest.mark.parametrize("server", [{"records": 2500}], indirect=True)
+	"""
+	options = {"records": 50, "users": 5, "subforms": 1}
+	options.update(getattr(request, "param", {}))
+	with MockArcherServer(**options) as server:
+		yield server
+
+
+@pytest.fixture
+def archer_instance(server):
+	archer_instance = server.create_archer_instance().from_application(server.application)
+	yield archer_instance
+	archer_instance.close()
+
+
+class TestMockArcher:
+	@pytest.mark.parametrize("server", [{"subforms": 3}], indirect=True)
+	def test_from_application(self, archer_instance):
+		assert archer_instance.application_level_id == "101"
+		assert len(archer_instance.subforms_json_by_sf_name) == 3
+		assert archer_instance.get_value_id_by_field_name_and_value("Severity", "Value 12") == [5012]
+
+	def test_records(self, server, archer_instance):
+		record_id = archer_instance.create_content_record({"Key": "new", "Title": "created"})
+		archer_instance.update_content_record({"Title": "updated"}, FIRST_RECORD_ID)
+		archer_instance.delete_record(FIRST_RECORD_ID + 1)
+
+		assert archer_instance.get_record(record_id).get_field_content("Title") == "created"
+		assert archer_instance.get_record(FIRST_RECORD_ID).get_field_content("Title") == "updated"
+		assert archer_instance.get_record(FIRST_RECORD_ID + 1) is None
+		assert archer_instance.get_grc_endpoint_records_count(server.application) == server.record_count
+
+	def test_grc_odata(self, server, archer_instance):
+		records = archer_instance.get_grc_endpoint_records(server.application, select=["Key", "Incidents_Id"],
+														   filter="Key ge '45'", orderby="Key desc")
+
+		assert [record["Key"] for record in records] == ["9", "8", "7", "6", "50", "5", "49", "48", "47", "46", "45"]
+		assert archer_instance.get_grc_endpoint_records_count(server.application, filter="Key ge '45'") == 11
+
+	@pytest.mark.parametrize("server", [{"records": 2500}], indirect=True)
+	def test_grc_concurrent_paging(self, server, archer_instance):
+		records = archer_instance.get_all_grc_endpoint_records(server.application, workers=4, select=["Key"], top=1500)
+
+		assert len(records) == 1500 and len({record["Key"] for record in records}) == 1500
+
+		server.count_supported = False
+		assert archer_instance.get_grc_endpoint_records_count(server.application) is None
+		records = archer_instance.get_all_grc_endpoint_records(server.application, workers=4, select=["Key"])
+		assert sorted(int(record["Key"]) for record in records) == list(range(1, 2501))
+
+	@pytest.mark.parametrize("server", [{"records": 2500}], indirect=True)
+	def test_grc_streaming(self, server, archer_instance):
+		request_count = server.request_count
+		records = archer_instance.iter_grc_endpoint_records(server.application, select=["Key"])
+
+		assert server.request_count == request_count
+		assert next(records) == {"Key": "1"} and server.request_count == request_count + 1
+
+		keys = ["1"] + [record["Key"] for record in records]
+		assert keys == [record["Key"] for record in archer_instance.get_all_grc_endpoint_records(
+			server.application, select=["Key"])]
+		assert len(keys) == 2500
+
+	def test_connection_pool(self, archer_instance):
+		for record_id in range(FIRST_RECORD_ID, FIRST_RECORD_ID + 10):
+			archer_instance.get_record(record_id)
+		stats = archer_instance.get_connection_stats()
+
+		assert stats["requests"] >= 10 and 0 < stats["connections"] < stats["requests"]
+		assert stats["reused"] == stats["requests"] - stats["connections"] > 0
+
+	def test_session_token_refresh(self, server, archer_instance):
+		server.expire_tokens()
+
+		assert archer_instance.get_record(FIRST_RECORD_ID).get_field_content("Key") == "1"
+
+	def test_session_token_refresh_stale_headers(self, server, archer_instance):
+		stale_header = dict(archer_instance.header)
+		server.expire_tokens()
+		archer_instance.get_session_token()
+		logins = archer_instance.metrics.get_summary()["login"]["calls"]
+		response = archer_instance.request("GET", f"{archer_instance.api_url_base}core/system/application/",
+										   headers=stale_header)
+
+		assert response.status_code == 200
+		assert archer_instance.metrics.get_summary()["login"]["calls"] == logins
+
+	def test_attachments(self, archer_instance, tmp_path):
+		content = os.urandom(100001)
+		(tmp_path / "evidence.bin").write_bytes(content)
+		attachment_id = archer_instance.post_attachment_file(str(tmp_path / "evidence.bin"), chunk_size=3000)
+		file_object = io.BytesIO()
+
+		assert archer_instance.download_attachment(attachment_id, str(tmp_path / "downloaded.bin")) == "evidence.bin"
+		assert (tmp_path / "downloaded.bin").read_bytes() == content
+		assert archer_instance.download_attachment(attachment_id, file_object, chunk_size=1000) == "evidence.bin"
+		assert file_object.getvalue() == content
+
+	def test_retried_responses_are_closed(self, server, archer_instance, tmp_path, monkeypatch):
+		closed = []
+		close = requests.Response.close
+		monkeypatch.setattr(requests.Response, "close",
+							lambda response: closed.append(response.status_code) or close(response))
+		(tmp_path / "evidence.bin").write_bytes(b"evidence")
+		attachment_id = archer_instance.post_attachment_file(str(tmp_path / "evidence.bin"))
+		server.expire_tokens()
+
+		assert archer_instance.download_attachment(attachment_id, str(tmp_path / "downloaded.bin")) == "evidence.bin"
+		assert 401 in closed
+
+		archer_instance.backoff_factor = 0
+		server.failing_application_ids.add(200)
+		assert archer_instance.get_subform_fields_by_id(200) is None
+		assert 500 in closed
+
+	@pytest.mark.parametrize("server", [{"records": 2500}], indirect=True)
+	def test_sync_unique_value_to_id_mapping(self, server, archer_instance, tmp_path):
+		state_file = str(tmp_path / "mapping.json")
+		result = archer_instance.sync_unique_value_to_id_mapping(server.application, "Key", state_file, prefix="INC-",
+																 updated_field="Last_Updated")
+		assert result == {"full": True, "changed": 2500, "deleted": 0}
+
+		archer_instance.update_content_record({"Key": "renamed"}, FIRST_RECORD_ID)
+		archer_instance.delete_record(FIRST_RECORD_ID + 1)
+		new_record_id = archer_instance.create_content_record({"Key": "new"})
+
+		archer_instance = server.create_archer_instance()
+		result = archer_instance.sync_unique_value_to_id_mapping(server.application, "Key", state_file, prefix="INC-",
+																 updated_field="Last_Updated")
+		assert not result["full"] and result["changed"] < 10 and result["deleted"] == 1
+		assert archer_instance.get_record_id_by_unique_value("INC-renamed") == FIRST_RECORD_ID
+		assert archer_instance.get_record_id_by_unique_value("INC-new") == new_record_id
+		assert archer_instance.get_record_id_by_unique_value("INC-1") is False
+		assert archer_instance.get_record_id_by_unique_value("INC-2") is False
+		assert len(archer_instance.key_field_value_to_system_id) == 2500
+
+	@pytest.mark.parametrize("server", [{"records": 2500}], indirect=True)
+	def test_sqlite_key_index(self, server, tmp_path):
+		archer_instance = server.create_archer_instance(key_index=SQLiteKeyIndex(str(tmp_path / "index.db")))
+		archer_instance.build_unique_value_to_id_mapping(server.application, "Key", prefix="INC-")
+		archer_instance.add_record_id_to_mapping("new", 5, prefix="INC-")
+		archer_instance.key_field_value_to_system_id.close()
+
+		index = SQLiteKeyIndex(str(tmp_path / "index.db"))
+		assert len(index) == 2501
+		assert index["INC-2500"] == FIRST_RECORD_ID + 2499
+		assert index.get_many(["INC-1", "INC-new", "INC-missing"]) == {"INC-1": FIRST_RECORD_ID, "INC-new": 5}
+		index.close()
+
+	@pytest.mark.parametrize("server", [{"records": 250}], indirect=True)
+	def test_export(self, server, archer_instance, tmp_path):
+		assert archer_instance.export_application(str(tmp_path / "records.ndjson"), server.application) == 250
+		rows = [json.loads(line) for line in (tmp_path / "records.ndjson").read_text().splitlines()]
+		assert [row["Id"] for row in rows] == list(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 250))
+		assert rows[12]["Severity"] == ["Value 2:Value 12"] and rows[12]["Owner"] == ["User 3"]
+
+		assert archer_instance.export_grc_endpoint(server.application, str(tmp_path / "records.csv"),
+												   select=["Incidents_Id", "Key"]) == 250
+		assert (tmp_path / "records.csv").read_text().splitlines()[:2] == ["Incidents_Id,Key", f"{FIRST_RECORD_ID},1"]
+
+	def test_compact_records(self, archer_instance):
+		records = list(archer_instance.get_records(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 20), chunk_size=7))
+
+		assert len({id(record.schema) for record in records}) == 1
+		assert not hasattr(records[0], "__dict__")
+		assert records[12].get_field_content("Severity") == ["Value 2:Value 12"]
+		assert records[12].get_field_content("Severity") is records[12].get_field_content("Severity")
+		assert records[3].to_dict(["Key", "Title", "Missing"]) == {"Key": "4", "Title": "Record 4", "Missing": None}
+		assert records[3].json["FieldContents"]["1001"]["Value"] == "4"
+		assert records[3].get_sequential_id() == 4
+
+		projected = archer_instance.get_record(FIRST_RECORD_ID + 3, fields=["Key", "Severity"])
+		assert len(projected.values) == 2 and len(projected.values) < len(projected.schema)
+		assert projected.to_dict(["Key", "Title"]) == {"Key": "4", "Title": None}
+		assert set(projected.json["FieldContents"]) == {"1001", "1003"}
+
+	def test_field_projection(self, server, archer_instance):
+		record = archer_instance.get_record(FIRST_RECORD_ID, fields=["Key", "Severity"])
+
+		assert sorted(server.requested_field_ids[-1]) == [1001, 1003]
+		assert record.get_field_content("Key") == "1"
+		assert record.get_field_content("Title") is None and record.get_field_content("Owner") is None
+
+		records = list(archer_instance.get_records(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 5), fields=["Title"]))
+		assert server.requested_field_ids[-1] == [1002]
+		assert [record.to_dict(["Key", "Title"]) for record in records][4] == {"Key": None, "Title": "Record 5"}
+
+	def test_typed_decoding(self, archer_instance):
+		sub_record_ids = [archer_instance.create_sub_record({"Text": f"comment {i}"}, "Subform 0") for i in range(3)]
+		archer_instance.update_content_record({"Subform 0": sub_record_ids[:2]}, FIRST_RECORD_ID)
+		archer_instance.update_content_record({"Subform 0": sub_record_ids[1:]}, FIRST_RECORD_ID + 1)
+		records = list(archer_instance.get_records(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 5)))
+
+		assert records[2].get_field_content("Last Updated") == datetime(2020, 1, 1, 0, 2)
+		assert records[0].get_field_content("Subform 0") == sub_record_ids[:2]
+		rows = decode_records(records, ["Owner", "Severity"], load_users=True)
+		assert rows[1]["Owner"][0].is_details_loaded() and rows[1]["Severity"] == ["Value 1"]
+
+		related = archer_instance.get_related_records(records, "Subform 0")
+		assert [sub_record.get_field_content("Text") for sub_record in related[FIRST_RECORD_ID + 1]] == \
+			   ["comment 1", "comment 2"]
+		assert related[FIRST_RECORD_ID + 2] == []
+		assert parse_archer_datetime("2020-01-15T13:45:00.1234567Z") == \
+			   datetime(2020, 1, 15, 13, 45, 0, 123456, tzinfo=timezone.utc)
+
+	def test_values_list_cache(self, server, archer_instance, monkeypatch):
+		archer_instance.get_values_list(500)
+		request_count = server.request_count
+		values_list = archer_instance.get_values_list(500)
+
+		assert server.request_count == request_count
+		assert values_list.get_path(5012) == "Value 2:Value 12"
+		assert values_list.get_value_id("Value 2:Value 12") == 5012
+
+		now = time.monotonic()
+		monkeypatch.setattr("rsa_archer.values_list_cache.time.monotonic", lambda: now + 3601)
+		archer_instance.get_values_list(500)
+		assert server.request_count == request_count + 1
+
+	def test_values_list_cache_lru(self, archer_instance):
+		cache = archer_instance.values_list_cache
+		cache.max_size = 2
+		for values_list_id in (1, 2, 3):
+			cache.put(values_list_id, values_list_id)
+		cache.get(2)
+		cache.put(4, 4)
+
+		assert [cache.get(values_list_id) for values_list_id in (1, 2, 3, 4)] == [None, 2, None, 4]
+
+	def test_metadata_cache(self, server, tmp_path):
+		metadata_cache = MetadataCache(str(tmp_path))
+		server.create_archer_instance(metadata_cache=metadata_cache).from_application(server.application)
+		archer_instance = server.create_archer_instance(metadata_cache=metadata_cache)
+		request_count = server.request_count
+		archer_instance.from_application(server.application)
+
+		assert server.request_count == request_count
+		assert archer_instance.get_field_id_by_name("Severity") == 1003
+		assert archer_instance.application_fields_json[1003]["Type"] == 4
+
+		archer_instance.invalidate_application_metadata(server.application)
+		archer_instance.from_application(server.application)
+		assert server.request_count > request_count
+		assert MetadataCache(str(tmp_path), ttl=-1).load(archer_instance.get_metadata_cache_key(server.application)) \
+			   is None
+
+	@pytest.mark.parametrize("server", [{"subforms": 3}], indirect=True)
+	def test_metadata_cache_incomplete_load(self, server, tmp_path):
+		metadata_cache = MetadataCache(str(tmp_path))
+		server.failing_application_ids.add(201)
+		archer_instance = server.create_archer_instance(metadata_cache=metadata_cache)
+		archer_instance.from_application(server.application)
+
+		assert metadata_cache.load(archer_instance.get_metadata_cache_key(server.application)) is None
+
+		server.failing_application_ids.clear()
+		archer_instance = server.create_archer_instance(metadata_cache=metadata_cache)
+		request_count = server.request_count
+		archer_instance.from_application(server.application)
+		assert server.request_count > request_count
+		assert len(archer_instance.subforms_json_by_sf_name) == 3
+
+	def test_state_file(self, tmp_path):
+		path = str(tmp_path / "state" / "state.json")
+		save_state_file(path, {"mapping": {"a": 1}}, 3, "test state")
+
+		assert load_state_file(path, 3, "test state")["mapping"] == {"a": 1}
+		assert load_state_file(path, 4, "test state") is None
+		assert os.listdir(tmp_path / "state") == ["state.json"]
+
+		(tmp_path / "state" / "state.json").write_text("{broken")
+		assert load_state_file(path, 3, "test state") is None
+		assert load_state_file(str(tmp_path / "missing.json"), 3, "test state") is None
+
+	def test_lazy_users(self, server, archer_instance):
+		request_count = server.request_count
+		user = archer_instance.get_user(3)
+
+		assert not user.is_loaded() and server.request_count == request_count
+		assert user.get_gisplay_name() == "User 3" and user.email == "user3@example.com"
+
+		users = archer_instance.load_users([1, 2, 3], load_email=False)
+		assert [user.get_username() for user in users] == ["user1", "user2", "user3"]
+		assert not users[0].is_email_loaded()
+
+	def test_bulk_upsert(self, server, archer_instance):
+		archer_instance.build_unique_value_to_id_mapping(server.application, "Key")
+		results = archer_instance.bulk_upsert([{"Key": "1", "Title": "updated"}, {"Key": "new", "Bogus": "x"},
+											   {"Key": "new2", "Severity": ["Value 3"]}], key_field="Key")
+
+		assert [result["status"] for result in results] == ["updated", "failed", "created"]
+		assert results[0]["id"] == FIRST_RECORD_ID and "Bogus" in results[1]["error"]
+		assert archer_instance.get_record(results[2]["id"]).get_field_content("Key") == "new2"
+		assert archer_instance.get_record_id_by_unique_value("new2") == results[2]["id"]
+
+	def test_record_writer(self, archer_instance):
+		writer = archer_instance.prepare_record_writer(["Key", "Severity"], json_backend="json")
+		body = json.loads(writer.build_body({"Key": "x", "Severity": ["Value 3"]}))
+
+		assert body["Content"]["LevelId"] == "101"
+		assert body["Content"]["FieldContents"]["1003"]["Value"] == [5003]
+		assert body["Content"]["FieldContents"]["1001"]["Value"] == "x"
+
+	def test_metrics(self, server):
+		events = []
+		archer_instance = server.create_archer_instance(metrics=RequestMetrics(callback=events.append))
+		archer_instance.from_application(server.application)
+		archer_instance.get_record(FIRST_RECORD_ID)
+		archer_instance.get_user(3).assign_role_to_user(7)
+		summary = archer_instance.metrics.get_summary()
+
+		assert summary["login"]["calls"] == 1 and summary["get_record"]["calls"] == 1
+		assert summary["get_record"]["bytes_received"] > 0 and summary["get_record"]["errors"] == 0
+		assert {event["operation"] for event in events} >= {"login", "get_application_metadata", "get_record"}
+		assert summary["update_user"]["calls"] == 1
+		assert archer_instance.get_operation_name("PUT", f"{archer_instance.api_url_base}core/system/usergroup",
+												  archer_instance.header) == "update_user"
+
+	def test_metrics_percentiles(self):
+		metrics = RequestMetrics(callback=lambda event: 1 / 0)  # failing callback is only logged
+		for duration in range(1, 101):
+			metrics.record("get_record", "POST", "url", 200 if duration % 10 else 500, duration / 100)
+		summary = metrics.get_summary()["get_record"]
+
+		assert (summary["p50"], summary["p90"], summary["p99"], summary["max"]) == (0.5, 0.9, 0.99, 1.0)
+		assert summary["calls"] == 100 and summary["errors"] == 10
+		assert get_percentile([], 50) is None
+
+	def test_governor_max_in_flight(self):
+		governor = RequestGovernor(max_in_flight=3, endpoint_limits={"content_write": {"max_in_flight": 1}})
+		in_flight = {"other": 0, "content_write": 0, "all": 0}
+		max_in_flight = dict(in_flight)
+		lock = threading.Lock()
+
+		def call(endpoint_class):
+			with governor.limit(endpoint_class):
+				with lock:
+					for key in (endpoint_class, "all"):
+						in_flight[key] += 1
+						max_in_flight[key] = max(max_in_flight[key], in_flight[key])
+				time.sleep(0.02)
+				with lock:
+					in_flight[endpoint_class] -= 1
+					in_flight["all"] -= 1
+
+		threads = [threading.Thread(target=call, args=(endpoint_class,))
+				   for endpoint_class in ["other"] * 10 + ["content_write"] * 5]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		assert max_in_flight["content_write"] == 1
+		assert max_in_flight["all"] == 3
+		with pytest.raises(ValueError):
+			RequestGovernor(endpoint_limits={"unknown": {"rate": 1}})
+
+	def test_rate_limiter(self):
+		rate_limiter = RateLimiter(rate=50, burst=1)
+		started = time.monotonic()
+		for _ in range(6):
+			rate_limiter.acquire()
+
+		assert time.monotonic() - started >= 0.09
+
+	def test_create_record_with_sub_records(self, archer_instance):
+		record_id = archer_instance.create_record_with_sub_records({"Key": "parent"},
+																   {"Subform 0": [{"Text": "a"}, {"Text": "b"}]})
+		related = archer_instance.get_related_records([archer_instance.get_record(record_id)], "Subform 0")
+
+		assert [sub_record.get_field_content("Text") for sub_record in related[record_id]] == ["a", "b"]
+
+	def test_create_record_with_sub_records_rollback(self, server, archer_instance):
+		next_record_id = server.next_record_id
+
+		# a sub record fails, created ones are deleted
+		assert archer_instance.create_record_with_sub_records(
+			{"Key": "parent"}, {"Subform 0": [{"Text": "a"}, {"Text": "b"}, {"Bogus": "c"}]}) is None
+		# the parent record fails
+		assert archer_instance.create_record_with_sub_records(
+			{"Key": "parent", "Bogus": "x"}, {"Subform 0": [{"Text": "a"}, {"Text": "b"}]}) is None
+
+		created_ids = range(next_record_id, server.next_record_id)
+		assert len(created_ids) == 4
+		assert all(server.get_record(record_id) is None for record_id in created_ids)
+
+	def test_connection_retries(self, server, monkeypatch):
+		archer_instance = server.create_archer_instance(max_retries=3, backoff_factor=0)
+		archer_instance.from_application(server.application)
+		archer_instance.close()  # pooled connections are dropped, so next calls connect again
+		connection_attempts = []
+
+		def refuse_connection(*args, **kwargs):
+			connection_attempts.append(args)
+			raise ConnectionRefusedError("refused")
+
+		monkeypatch.setattr("urllib3.util.connection.create_connection", refuse_connection)
+
+		assert archer_instance.get_record(FIRST_RECORD_ID) is None
+		assert len(connection_attempts) == 4
+		assert archer_instance.metrics.get_summary()["get_record"]["attempts"] == 4
+
+		# connection was not established, so even record creation is repeated
+		assert archer_instance.create_content_record({"Key": "new"}) is None
+		assert len(connection_attempts) == 8
+
+	def test_grc_odata_special_characters(self, server, archer_instance):
+		for title in ("a#b", "R&D", "a+b c", "50% off"):
+			archer_instance.create_content_record({"Key": "special", "Title": title})
+		filter = "Title eq '%s' and Key eq 'special'"
+
+		for title in ("a#b", "R&D", "a+b c", "50% off"):
+			records = archer_instance.get_grc_endpoint_records(server.application, select=["Title"],
+															   filter=filter % title)
+			assert records == [{"Title": title}]
+			assert archer_instance.get_grc_endpoint_records_count(server.application, filter=filter % title) == 1
+
+		# date with time zone offset, 2020-01-01T00:01:00 UTC is Last_Updated of the record with Key 2
+		records = archer_instance.get_grc_endpoint_records(
+			server.application, select=["Key"], filter="Last_Updated eq " + format_odata_literal("2020-01-01T01:01:00+01:00"))
+		assert records == [{"Key": "2"}]
+
+	def test_subform_values_list(self, server, archer_instance):
+		sub_record_id = archer_instance.create_sub_record(
+			{"Text": "a", "Severity": {"ValuesListIds": [5012], "OtherText": None}}, "Subform 0")
+		archer_instance.update_content_record({"Subform 0": [sub_record_id]}, FIRST_RECORD_ID)
+		record = archer_instance.get_record(FIRST_RECORD_ID)
+		archer_instance.get_values_list(500)
+		request_count = server.request_count
+
+		sub_records = archer_instance.get_related_records([record], "Subform 0")[FIRST_RECORD_ID]
+		assert [sub_record.get_field_content("Severity") for sub_record in sub_records] == [["Value 2:Value 12"]]
+		assert server.request_count == request_count + 1
+
+		# values list id is unknown without application metadata, no call is made for it
+		archer_instance = server.create_archer_instance()
+		records = list(archer_instance.get_records(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 5)))
+		request_count = server.request_count
+		assert [record.get_field_content_by_id(1003) for record in records] == [None] * 5
+		assert server.request_count == request_count
+
+	def test_record_schema_level_id_collision(self, archer_instance):
+		subform_fields_json, all_fields = archer_instance.parse_subform_fields(
+			[{"RequestedObject": {"Id": 7001, "Name": "Text", "Type": 1, "LevelId": 7002}},
+			 {"RequestedObject": {"Id": 7002, "Name": "Notes", "Type": 1, "LevelId": 7002}}])
+		subform_fields_json["AllFields"] = all_fields
+		archer_instance.subforms_json_by_sf_name["Collision"] = subform_fields_json
+		schema = archer_instance.get_record_schema(7002)
+
+		assert schema.field_ids == [7001, 7002] and schema.field_names == ["Text", "Notes"]
+		assert "LevelId" not in schema.positions_by_name
+
+
+class TestMockAsyncArcher:
+	@pytest.mark.parametrize("server", [{"records": 2500}], indirect=True)
+	def test_async_client(self, server):
+		async def run():
+			async with server.create_async_archer_instance() as archer_instance:
+				assert archer_instance.session_token
+
+				await archer_instance.from_application(server.application)
+				assert archer_instance.application_level_id == "101"
+				assert archer_instance.get_field_id_by_name("Severity") == 1003
+
+				records = await archer_instance.get_records(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 250), chunk_size=30)
+				assert [record.id for record in records] == list(range(FIRST_RECORD_ID, FIRST_RECORD_ID + 250))
+				assert records[12].get_field_content("Severity") == ["Value 2:Value 12"]
+
+				record_id = await archer_instance.create_content_record({"Key": "new", "Title": "R&D #1+1"})
+				await archer_instance.update_content_record({"Severity": ["Value 3"]}, record_id)
+				record = await archer_instance.get_record(record_id)
+				assert record.to_dict(["Key", "Title"]) == {"Key": "new", "Title": "R&D #1+1"}
+
+				server.expire_tokens()
+				assert (await archer_instance.get_record(FIRST_RECORD_ID)).get_field_content("Key") == "1"
+				assert archer_instance.metrics.get_summary()["login"]["calls"] == 2
+
+				all_records = await archer_instance.get_all_grc_endpoint_records(server.application, select=["Key"])
+				assert len(all_records) == 2501 and all_records[2499] == {"Key": "2500"}
+				filtered = await archer_instance.get_all_grc_endpoint_records(server.application,
+																			  filter="Title eq 'R&D #1+1'")
+				assert [record["Key"] for record in filtered] == ["new"]
+
+		asyncio.run(run())
+
+	@pytest.mark.parametrize("server", [{"subforms": 3}], indirect=True)
+	def test_async_metadata_cache_incomplete_load(self, server, tmp_path):
+		metadata_cache = MetadataCache(str(tmp_path))
+		server.failing_application_ids.add(201)
+
+		async def run():
+			async with server.create_async_archer_instance(metadata_cache=metadata_cache) as archer_instance:
+				await archer_instance.from_application(server.application, preload_values_lists=False)
+				assert metadata_cache.load(archer_instance.get_metadata_cache_key(server.application)) is None
+
+		asyncio.run(run())
+
+	def test_async_users(self, server):
+		async def run():
+			async with server.create_async_archer_instance() as archer_instance:
+				await archer_instance.from_application(server.application)
+				records = await archer_instance.get_records([FIRST_RECORD_ID + 2])
+				owner = records[0].get_field_content("Owner")[0]
+
+				with pytest.raises(RuntimeError, match="load_users"):
+					owner.get_gisplay_name()
+				with pytest.raises(TypeError, match="load_users"):
+					decode_records(records, ["Owner"], load_users=True)
+
+				await archer_instance.load_users([owner.get_user_id()])
+				assert owner.get_gisplay_name() == "User 3" and owner.email == "user3@example.com"
+
+		asyncio.run(run())
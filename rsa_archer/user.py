@@ -1,6 +1,6 @@
+import inspect
 import logging
 import json
-import requests
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 log = logging.getLogger(__name__)
@@ -11,28 +11,90 @@ class User:
 		:param archer_instance - archer instance object
 		:param json:
 		:param user_id: if you know it you can create user object directly
+		User details and email are loaded from Archer on the first access,
+		use ArcherInstance.load_users() to load them for many users at once
 	"""
 	def __init__(self, archer_instance=None, json=None, user_id=None):
 		self.user_id = None
-		self.json = {}
+		self._json = None
 		self.archer_instance = archer_instance
-		self.email = ""
+		self._email = None
 
 		if json:
-			self.json = json["RequestedObject"]
-			self.user_id = self.json["Id"]
+			self._json = json["RequestedObject"]
+			self.user_id = self._json["Id"]
 
 		if user_id:
 			self.user_id = str(user_id)
-			response = self.archer_instance.get_user_by_id(self.user_id)
-			self.json = response.json
 
-		self.capture_user_email()
+	@property
+	def json(self):
+		if self._json is None:
+			self.load_user_details()
+		return self._json
+
+	@json.setter
+	def json(self, value):
+		self._json = value
+
+	@property
+	def email(self):
+		if self._email is None:
+			self.capture_user_email()
+		return self._email
+
+	@email.setter
+	def email(self, value):
+		self._email = value
+
+	def is_loaded(self):
+		"""
+		:return: True if both user details and email are already loaded
+		"""
+		return self.is_details_loaded() and self.is_email_loaded()
+
+	def is_details_loaded(self):
+		return self._json is not None
+
+	def is_email_loaded(self):
+		return self._email is not None
+
+	def load(self, load_details=True, load_email=True):
+		"""
+		:param load_details: load user details if they are not loaded yet
+		:param load_email: load user email if it's not loaded yet
+		:return: self
+		"""
+		if load_details and not self.is_details_loaded():
+			self.load_user_details()
+		if load_email and not self.is_email_loaded():
+			self.capture_user_email()
+		return self
+
+	def check_archer_instance(self):
+		"""
+		Users of AsyncArcherInstance can't be loaded lazily, their requests must be awaited
+		"""
+		if inspect.iscoroutinefunction(self.archer_instance.request):
+			raise RuntimeError(f"User {self.user_id} is not loaded, call await archer_instance.load_users() first")
+
+	def load_user_details(self):
+		self.check_archer_instance()
+		api_url = f"{self.archer_instance.api_url_base}core/system/user/{self.user_id}"
+		try:
+			response = self.archer_instance.request("POST", api_url, headers=self.archer_instance.header)
+			data = json.loads(response.content.decode("utf-8"))
+			self.json = data["RequestedObject"]
+
+		except Exception as e:
+			self.json = {}
+			log.error("Exception %s. Cannot load details for user ID %s", e, self.user_id)
 
 	def capture_user_email(self):
+		self.check_archer_instance()
 		api_url = f"{self.archer_instance.api_url_base}core/system/usercontact/{self.user_id}"
 		try:
-			response = requests.get(api_url, headers=self.archer_instance.header, verify=False)
+			response = self.archer_instance.request("GET", api_url, headers=self.archer_instance.header)
 			if response.status_code != 200:
 				self.email = ""
 				log.debug("Cannot load email for user ID %s", self.user_id)
@@ -42,7 +104,7 @@ class User:
 
 		except Exception as e:
 			self.email =""
-			log.error("Exception %s. Guess there is no email for user %s", e, self.json["DisplayName"])
+			log.error("Exception %s. Guess there is no email for user ID %s", e, self.user_id)
 
 	def get_user_email(self):
 		return self.email
@@ -51,22 +113,25 @@ class User:
 		return self.user_id
 
 	def get_gisplay_name(self):
+		user_json = self.json  # not caught, so a user of AsyncArcherInstance which is not loaded raises
 		try:
-			return self.json["DisplayName"]
+			return user_json["DisplayName"]
 		except:
 			log.error("Returning None for DisplayName for %s", self.user_id)
 			return None
 
 	def get_username(self):
+		user_json = self.json
 		try:
-			return self.json["UserName"]
+			return user_json["UserName"]
 		except:
 			log.error("Returning None for UserName for %s", self.get_gisplay_name())
 			return None
 
 	def get_last_login_date(self):
+		user_json = self.json
 		try:
-			return self.json["LastLoginDate"]
+			return user_json["LastLoginDate"]
 		except:
 			log.error("Returning None for LastLoginDate for %s", self.get_gisplay_name())
 			return None
@@ -80,7 +145,7 @@ class User:
 		request_body = {"UserId": f"{self.user_id}", "RoleId": f"{role_id}", "IsAdd": "true"}
 
 		try:
-			response = requests.put(api_url, headers=self.archer_instance.header, json=request_body, verify=False)
+			response = self.archer_instance.request("PUT", api_url, headers=self.archer_instance.header, json=request_body)
 			if response.status_code != 200:
 				log.error("User with ID %s can not be added a role %s", self.user_id, role_id)
 			else:
@@ -99,7 +164,7 @@ class User:
 		request_body = {"UserId": f"{self.user_id}", "GroupId": f"{group_id}", "IsAdd": "true"}
 
 		try:
-			response = requests.put(api_url, headers=self.archer_instance.header, json=request_body, verify=False)
+			response = self.archer_instance.request("PUT", api_url, headers=self.archer_instance.header, json=request_body)
 			if response.status_code != 200:
 				print(response)
 				log.error("User %s can not be added to a group %s", self.get_user_email(), group)
@@ -118,7 +183,7 @@ class User:
 		api_url = f"{self.archer_instance.api_url_base}core/system/user/status/active/{self.user_id}"
 
 		try:
-			response = requests.post(api_url, headers=post_header, verify=False)
+			response = self.archer_instance.request("POST", api_url, headers=post_header)
 			if response.status_code != 200:
 				print(response)
 				log.error("User %s can not be activated", self.user_id)
@@ -137,7 +202,7 @@ class User:
 		api_url = f"{self.archer_instance.api_url_base}core/system/user/status/inactive/{self.user_id}"
 
 		try:
-			response = requests.post(api_url, headers=post_header, verify=False)
+			response = self.archer_instance.request("POST", api_url, headers=post_header)
 			if response.status_code != 200:
 				print(response)
 				log.error("User %s can not be deactivated", self.user_id)
@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+def has_value_names(value_content):
+	"""
+	:param value_content: [id1, "Value", ...] or {"ValuesListIds": [...], "OtherText": None}
+	:return: True if there are names of values, which should be replaced with ids
+	"""
+	if isinstance(value_content, dict):
+		value_content = value_content.get("ValuesListIds")
+	return isinstance(value_content, list) and any(isinstance(value, str) for value in value_content)
+
+
+class ValuesList:
+	"""
+	Values of one Archer values list with precomputed full paths of the values,
+	reverse name to id index is built on the first lookup by name
+		:param values - response of core/system/valueslistvalue/flat/valueslist/{id}:
+					[{'RequestedObject': {'Id': 69809, 'Name': 'Value', 'ParentId': 69808}}, ...]
+	"""
+
+	def __init__(self, values):
+		self.id_to_name = {}
+		self.id_to_parent_id = {}
+
+		for value in values:
+			value_id = value["RequestedObject"]["Id"]
+			self.id_to_name[value_id] = value["RequestedObject"]["Name"]
+			self.id_to_parent_id[value_id] = value["RequestedObject"]["ParentId"]
+
+		self.id_to_path = {}
+		for value_id in self.id_to_name:
+			self.id_to_path[value_id] = self.build_path(value_id)
+
+		self.name_to_id = None
+		self.path_to_id = None
+
+	def build_path(self, value_id):
+		"""
+		:param value_id: internal value id
+		:return: "Parent Value:Value" for leveled values list, "Value" otherwise
+		"""
+		names = []
+		visited = set()
+		current_id = value_id
+
+		while current_id and current_id not in visited:
+			if current_id in self.id_to_path:  # parent path is already built
+				names.append(self.id_to_path[current_id])
+				break
+			visited.add(current_id)
+			names.append(self.id_to_name[current_id])
+			current_id = self.id_to_parent_id.get(current_id)
+
+		return ":".join(reversed(names))
+
+	def get_path(self, value_id):
+		"""
+		:param value_id: internal value id
+		:return: "Parent Value:Value" or None if there is no such value in the list
+		"""
+		return self.id_to_path.get(value_id)
+
+	def build_name_index(self):
+		"""
+		Fills name_to_id {"Value": id} and path_to_id {"Parent Value:Value": id},
+		if the same name is used under several parents the first value wins, use full path for the others
+		"""
+		name_to_id = {}
+		for value_id, name in self.id_to_name.items():
+			name_to_id.setdefault(name, value_id)
+
+		self.path_to_id = {path: value_id for value_id, path in self.id_to_path.items()}
+		self.name_to_id = name_to_id
+
+	def get_value_id(self, value):
+		"""
+		:param value: "Value" or "Parent Value:Value"
+		:return: internal value id or None if there is no such value in the list
+		"""
+		if self.name_to_id is None:
+			self.build_name_index()
+
+		value_id = self.path_to_id.get(value)
+		if value_id is None:
+			value_id = self.name_to_id.get(value)
+		return value_id
+
+	def resolve_value_names(self, value_content, field_name=""):
+		"""
+		:param value_content: [id1, "Value", "Parent Value:Value"] or {"ValuesListIds": [...], "OtherText": None}
+		:param field_name: used in the log message only
+		:return: same value_content where names of values are replaced with internal ids, unknown names are skipped
+		"""
+		if isinstance(value_content, dict) and "ValuesListIds" in value_content:
+			resolved_content = dict(value_content)
+			resolved_content["ValuesListIds"] = self.resolve_value_names(value_content["ValuesListIds"], field_name)
+			return resolved_content
+
+		if not isinstance(value_content, list):
+			return value_content
+
+		resolved_content = []
+		for value in value_content:
+			if isinstance(value, str):
+				value_id = self.get_value_id(value)
+				if value_id is None:
+					log.error("Value %s is not found in values list %s", value, field_name)
+					continue
+				value = value_id
+			resolved_content.append(value)
+
+		return resolved_content
+
+
+class ValuesListCache:
+	"""
+	LRU cache of ValuesList objects by values list id, safe to share between threads
+		:param max_size - max number of values lists kept, the least recently used is evicted first
+		:param ttl - seconds after which values list is downloaded again, None keeps it forever
+	"""
+
+	def __init__(self, max_size=256, ttl=3600):
+		self.max_size = max_size
+		self.ttl = ttl
+		self.values_lists = OrderedDict()
+		self.lock = threading.Lock()
+
+	def get(self, values_list_id):
+		"""
+		:param values_list_id: internal values list id
+		:return: ValuesList object or None if it's not cached or expired
+		"""
+		key = str(values_list_id)
+
+		with self.lock:
+			cached = self.values_lists.get(key)
+			if cached is None:
+				return None
+
+			loaded_at, values_list = cached
+			if self.ttl is not None and time.monotonic() - loaded_at > self.ttl:
+				del self.values_lists[key]
+				return None
+
+			self.values_lists.move_to_end(key)
+			return values_list
+
+	def put(self, values_list_id, values_list):
+		"""
+		:param values_list_id: internal values list id
+		:param values_list: ValuesList object
+		"""
+		key = str(values_list_id)
+
+		with self.lock:
+			self.values_lists[key] = (time.monotonic(), values_list)
+			self.values_lists.move_to_end(key)
+			while len(self.values_lists) > self.max_size:
+				self.values_lists.popitem(last=False)
+
+	def invalidate(self, values_list_id=None):
+		"""
+		:param values_list_id: drop one values list, or everything if not provided
+		"""
+		with self.lock:
+			if values_list_id is None:
+				self.values_lists.clear()
+			else:
+				self.values_lists.pop(str(values_list_id), None)
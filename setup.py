@@ -28,4 +28,9 @@ setup(
     	'Topic :: Software Development :: Libraries'
     	],
 		install_requires=requires,
+		extras_require={
+			'async': ['aiohttp'],
+			'fast': ['orjson'],
+			'parquet': ['pyarrow'],
+		},
 )